@@ -1,15 +1,180 @@
-import requests
-import json
+import asyncio
+import hashlib
+import httpx
+import random
+import threading
+import orjson
+from collections import OrderedDict
 from config import Config
 import logging
 
+try:
+    import uvloop
+except ImportError:  # optional, faster event loop implementation
+    uvloop = None
+
 logger = logging.getLogger(__name__)
 
+# All API traffic runs on a single background event loop so that many LLM
+# calls can be in flight at once, whether the caller is an async Flask view
+# or synchronous code such as the Excel processors.
+_loop = None
+_loop_lock = threading.Lock()
+_http_client = None
+
+def _get_loop():
+    """Return the shared background event loop, starting it on first use"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = uvloop.new_event_loop() if uvloop else asyncio.new_event_loop()
+            thread = threading.Thread(target=_loop.run_forever, name="api-client-loop", daemon=True)
+            thread.start()
+    return _loop
+
+def run_sync(coro):
+    """Run a coroutine on the background loop and block until it completes"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+async def run_async(coro):
+    """Run a coroutine on the background loop and await it from any other loop"""
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, _get_loop()))
+
+def _get_http_client():
+    """Return the process-wide HTTP client, creating it inside the background loop on first use
+    
+    Every client shares one connection pool, so TCP and TLS handshakes to the
+    API hosts are paid once and then kept alive across calls. HTTP/2 lets
+    concurrent requests to the same host share a single connection.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(Config.LLM_READ_TIMEOUT, connect=Config.LLM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30)
+        )
+    return _http_client
+
+def close_session():
+    """Close the shared HTTP client, if one was opened"""
+    if _http_client is not None and not _http_client.is_closed:
+        run_sync(_http_client.aclose())
+
+# Transient upstream failures worth retrying (rate limits and gateway errors)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+MAX_RETRY_AFTER = 30
+
+def _retry_delay(attempt, retry_after=None):
+    """Seconds to wait before the next attempt, honouring a Retry-After header"""
+    if retry_after:
+        try:
+            return min(float(retry_after), MAX_RETRY_AFTER)
+        except ValueError:
+            pass
+    # Full jitter keeps concurrent retries from arriving in lockstep
+    return random.uniform(0, BACKOFF_FACTOR * (2 ** attempt))
+
+async def _post_json(url, headers, data, params=None):
+    """POST a JSON body and return the decoded JSON response, retrying transient failures"""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            response = await _get_http_client().post(url, headers=headers, content=orjson.dumps(data), params=params)
+            if response.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+                delay = _retry_delay(attempt, response.headers.get('Retry-After'))
+                logger.warning(f"Upstream returned {response.status_code}, retrying in {delay:.2f}s")
+            else:
+                if response.status_code >= 400:
+                    logger.error(f"Response status: {response.status_code}")
+                    logger.error(f"Response body: {response.text}")
+                response.raise_for_status()
+                return orjson.loads(response.content)
+        except httpx.TransportError as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = _retry_delay(attempt)
+            logger.warning(f"Upstream request failed ({e!r}), retrying in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+async def _post_json_stream(url, headers, data, params=None):
+    """POST a JSON body and yield each server-sent event payload as decoded JSON"""
+    async with _get_http_client().stream("POST", url, headers=headers, content=orjson.dumps(data), params=params) as response:
+        if response.status_code >= 400:
+            await response.aread()
+            logger.error(f"Response status: {response.status_code}")
+            logger.error(f"Response body: {response.text}")
+        response.raise_for_status()
+        
+        async for line in response.aiter_lines():
+            line = line.strip()
+            if not line.startswith("data:"):
+                continue
+            payload = line[5:].strip()
+            if payload == "[DONE]":
+                break
+            yield orjson.loads(payload)
+
+def _iterate_sync(agen):
+    """Drive an async generator on the background loop from synchronous code"""
+    loop = _get_loop()
+    try:
+        while True:
+            try:
+                item = asyncio.run_coroutine_threadsafe(agen.__anext__(), loop).result()
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        asyncio.run_coroutine_threadsafe(agen.aclose(), loop).result()
+
+def _cache_key(payload):
+    """Stable hash of a request body, used as the response cache key"""
+    encoded = orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+class ResponseCache:
+    """In-memory LRU cache for deterministic (temperature 0) API responses, stored orjson-encoded"""
+    
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+    
+    def get(self, key):
+        """Return the cached response for key, or None on a miss"""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            # Decoded per hit, so a caller mutating its result cannot change later hits
+            return orjson.loads(self._entries[key])
+        self.misses += 1
+        return None
+    
+    def set(self, key, value):
+        """Store an orjson-encoded response, evicting the least recently used entry when full"""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+    
+    def stats(self):
+        """Return hit/miss counters and the number of cached keys"""
+        return {"hits": self.hits, "misses": self.misses, "keys": len(self._entries)}
+
 class OpenAPIClient:
     """Client for making requests to OpenAPI services"""
     
+    # Upper bound on concurrent upstream calls issued by one batch request
+    BATCH_CONCURRENCY = 20
+    
     def __init__(self):
         self.provider = Config.OPENAI_PROVIDER
+        self.cache = ResponseCache(maxsize=Config.LLM_CACHE_SIZE)
+        self._inflight = {}
+        self._batch_semaphore = None
         
         if self.provider == 'azure':
             self.api_key = Config.AZURE_OPENAI_API_KEY
@@ -26,11 +191,36 @@ class OpenAPIClient:
             
             if not self.api_key:
                 raise ValueError("OPENAI_API_KEY not configured")
+        
+        # The provider is fixed for the client's lifetime, so the request
+        # pieces that depend on it are built once here rather than per call
+        self.chat_url = Config.OPENAI_CHAT_URL
+        self.completion_url = Config.OPENAI_COMPLETION_URL
+        self.headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        # Azure selects the model through the deployment in the URL;
+        # standard OpenAI needs it in the request body
+        if self.provider == 'azure':
+            self.params = {'api-version': self.api_version}
+            self.extra_body = {}
+            self.completion_extra_body = {}
+            self.model_id = self.deployment
+        else:
+            self.params = {}
+            self.extra_body = {"model": self.model}
+            self.completion_extra_body = {"model": "text-davinci-003"}  # Legacy model
+            self.model_id = self.model
     
     def make_chat_completion(self, messages, temperature=0.7, max_tokens=1000):
         """
         Make a chat completion request to OpenAI API
         
+        Responses to temperature 0 requests are deterministic and are served
+        from an in-memory LRU cache when the same request is repeated.
+        
         Args:
             messages (list): List of message dictionaries
             temperature (float): Sampling temperature
@@ -39,42 +229,127 @@ class OpenAPIClient:
         Returns:
             dict: API response
         """
-        if self.provider == 'azure':
-            url = f"{self.api_base}/openai/deployments/{self.deployment}/chat/completions"
-            params = {'api-version': self.api_version}
-        else:
-            url = f"{self.api_base}/chat/completions"
-            params = {}
-        
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
+        return run_sync(self._chat_completion(messages, temperature, max_tokens))
+    
+    async def make_chat_completion_async(self, messages, temperature=0.7, max_tokens=1000):
+        """Async variant of make_chat_completion, awaitable from any event loop"""
+        return await run_async(self._chat_completion(messages, temperature, max_tokens))
+    
+    def _build_chat_request(self, messages, temperature, max_tokens):
+        """Return the url, query params, headers and body for a chat completion"""
         data = {
+            **self.extra_body,
             "messages": messages,
             "temperature": temperature,
             "max_tokens": max_tokens
         }
         
-        # Add model for standard OpenAI (not needed for Azure)
-        if self.provider != 'azure':
-            data["model"] = self.model
+        return self.chat_url, self.params, self.headers, data
+    
+    async def _chat_completion(self, messages, temperature, max_tokens):
+        url, params, headers, data = self._build_chat_request(messages, temperature, max_tokens)
+        
+        # Sampled output differs per call, so only deterministic calls are
+        # cached or share an in-flight request
+        if temperature != 0:
+            return await self._send_chat_completion(url, params, headers, data)
+        
+        cache_key = _cache_key({
+            "messages": messages,
+            "model": self.model_id,
+            "max_tokens": max_tokens
+        })
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            logger.info("OpenAI API response served from cache")
+            return cached
+        
+        # Identical requests already in flight share a single upstream call
+        inflight_key = _cache_key({"url": url, "body": data})
+        task = self._inflight.get(inflight_key)
+        if task is None:
+            task = asyncio.ensure_future(self._send_cached_chat_completion(url, params, headers, data, cache_key))
+            self._inflight[inflight_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(inflight_key, None))
+        else:
+            logger.info("Joining in-flight OpenAI API request")
+        # Every caller sharing the request decodes its own copy of the response
+        return orjson.loads(await asyncio.shield(task))
+    
+    def make_chat_completions_batch(self, messages_list, temperature=0.7, max_tokens=1000):
+        """
+        Make several chat completion requests concurrently
         
+        Args:
+            messages_list (list): List of message lists, one per completion
+            temperature (float): Sampling temperature
+            max_tokens (int): Maximum tokens to generate
+            
+        Returns:
+            list: API responses in request order; a failed request is returned
+                as the exception it raised
+        """
+        return run_sync(self._chat_completions_batch(messages_list, temperature, max_tokens))
+    
+    async def make_chat_completions_batch_async(self, messages_list, temperature=0.7, max_tokens=1000):
+        """Async variant of make_chat_completions_batch, awaitable from any event loop"""
+        return await run_async(self._chat_completions_batch(messages_list, temperature, max_tokens))
+    
+    async def _chat_completions_batch(self, messages_list, temperature, max_tokens):
+        # Created lazily so the semaphore belongs to the client event loop
+        if self._batch_semaphore is None:
+            self._batch_semaphore = asyncio.Semaphore(self.BATCH_CONCURRENCY)
+        
+        async def limited(messages):
+            async with self._batch_semaphore:
+                return await self._chat_completion(messages, temperature, max_tokens)
+        
+        logger.info(f"Making {len(messages_list)} OpenAI API requests concurrently")
+        return await asyncio.gather(*(limited(m) for m in messages_list), return_exceptions=True)
+    
+    async def _send_cached_chat_completion(self, url, params, headers, data, cache_key):
+        # Encoded once, both for the cache and for the callers awaiting this request
+        encoded = orjson.dumps(await self._send_chat_completion(url, params, headers, data))
+        self.cache.set(cache_key, encoded)
+        return encoded
+    
+    async def _send_chat_completion(self, url, params, headers, data):
         try:
             logger.info(f"Making OpenAI API request to {url}")
-            response = requests.post(url, headers=headers, json=data, params=params, timeout=120)
-            response.raise_for_status()
-            
-            result = response.json()
+            result = await _post_json(url, headers, data, params=params)
             logger.info("OpenAI API request successful")
             return result
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"OpenAI API request failed: {str(e)}")
-            if hasattr(e, 'response') and e.response is not None:
-                logger.error(f"Response status: {e.response.status_code}")
-                logger.error(f"Response body: {e.response.text}")
+            raise
+    
+    def make_chat_completion_stream(self, messages, temperature=0.7, max_tokens=1000):
+        """
+        Make a streaming chat completion request to OpenAI API
+        
+        Args:
+            messages (list): List of message dictionaries
+            temperature (float): Sampling temperature
+            max_tokens (int): Maximum tokens to generate
+            
+        Yields:
+            dict: Completion chunks as they arrive from the API
+        """
+        return _iterate_sync(self._chat_completion_stream(messages, temperature, max_tokens))
+    
+    async def _chat_completion_stream(self, messages, temperature, max_tokens):
+        url, params, headers, data = self._build_chat_request(messages, temperature, max_tokens)
+        data["stream"] = True
+        
+        try:
+            logger.info(f"Making streaming OpenAI API request to {url}")
+            async for chunk in _post_json_stream(url, headers, data, params=params):
+                yield chunk
+            logger.info("Streaming OpenAI API request completed")
+        
+        except httpx.HTTPError as e:
+            logger.error(f"Streaming OpenAI API request failed: {str(e)}")
             raise
     
     def make_completion(self, prompt, temperature=0.7, max_tokens=1000):
@@ -89,42 +364,28 @@ class OpenAPIClient:
         Returns:
             dict: API response
         """
-        if self.provider == 'azure':
-            url = f"{self.api_base}/openai/deployments/{self.deployment}/completions"
-            params = {'api-version': self.api_version}
-        else:
-            url = f"{self.api_base}/completions"
-            params = {}
-        
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
+        return run_sync(self._completion(prompt, temperature, max_tokens))
+    
+    async def make_completion_async(self, prompt, temperature=0.7, max_tokens=1000):
+        """Async variant of make_completion, awaitable from any event loop"""
+        return await run_async(self._completion(prompt, temperature, max_tokens))
+    
+    async def _completion(self, prompt, temperature, max_tokens):
         data = {
+            **self.completion_extra_body,
             "prompt": prompt,
             "temperature": temperature,
             "max_tokens": max_tokens
         }
         
-        # Add model for standard OpenAI (not needed for Azure)
-        if self.provider != 'azure':
-            data["model"] = "text-davinci-003"  # Legacy model
-        
         try:
-            logger.info(f"Making OpenAI completion request to {url}")
-            response = requests.post(url, headers=headers, json=data, params=params, timeout=120)
-            response.raise_for_status()
-            
-            result = response.json()
+            logger.info(f"Making OpenAI completion request to {self.completion_url}")
+            result = await _post_json(self.completion_url, self.headers, data, params=self.params)
             logger.info("OpenAI completion request successful")
             return result
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"OpenAI completion request failed: {str(e)}")
-            if hasattr(e, 'response') and e.response is not None:
-                logger.error(f"Response status: {e.response.status_code}")
-                logger.error(f"Response body: {e.response.text}")
             raise
 
 class AnthropicClient:
@@ -148,6 +409,13 @@ class AnthropicClient:
         Returns:
             dict: API response
         """
+        return run_sync(self._message(messages, model, max_tokens))
+    
+    async def make_message_async(self, messages, model="claude-3-sonnet-20240229", max_tokens=1000):
+        """Async variant of make_message, awaitable from any event loop"""
+        return await run_async(self._message(messages, model, max_tokens))
+    
+    async def _message(self, messages, model, max_tokens):
         url = "https://api.anthropic.com/v1/messages"
         
         headers = {
@@ -164,13 +432,10 @@ class AnthropicClient:
         
         try:
             logger.info(f"Making Anthropic API request to {url}")
-            response = requests.post(url, headers=headers, json=data, timeout=30)
-            response.raise_for_status()
-            
-            result = response.json()
+            result = await _post_json(url, headers, data)
             logger.info("Anthropic API request successful")
             return result
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Anthropic API request failed: {str(e)}")
             raise 
\ No newline at end of file
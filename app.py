@@ -1,26 +1,49 @@
-from flask import Flask, jsonify, request, send_file, render_template
+from flask import Flask, Response, g, jsonify, request, send_file, render_template, stream_with_context
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+import atexit
+import msgspec
+import orjson
+import queue
+import time
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 import logging
-from logging.handlers import TimedRotatingFileHandler
+import mimetypes
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 import os
-from datetime import datetime
+from pathlib import Path
+from urllib.parse import quote
 from config import Config
-from api_client import OpenAPIClient, AnthropicClient
+from api_client import OpenAPIClient, AnthropicClient, close_session
 from excel_processor import ExcelProcessor
+from schemas import anthropic_chat_request_decoder, batch_chat_request_decoder, chat_request_decoder
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 
 app = Flask(__name__)
 
-# Create logs directory if it doesn't exist
-if not os.path.exists('logs'):
-    os.makedirs('logs')
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson for request parsing and jsonify"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=DefaultJSONProvider.default, option=orjson.OPT_NON_STR_KEYS).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+app.json = ORJSONProvider(app)
 
-# Create uploads directory if it doesn't exist
-if not os.path.exists('uploads'):
-    os.makedirs('uploads')
+# Working directories, resolved once against the current directory;
+# mkdir(exist_ok=True) is a single syscall per directory
+LOG_DIR = Path('logs').resolve()
+UPLOAD_DIR = Path('uploads').resolve()
+OUTPUT_DIR = Path('document').resolve()
+TEMPLATE_DIR = Path('templates').resolve()
 
-# Create templates directory if it doesn't exist
-if not os.path.exists('templates'):
-    os.makedirs('templates')
+for directory in (LOG_DIR, UPLOAD_DIR, OUTPUT_DIR, TEMPLATE_DIR):
+    directory.mkdir(exist_ok=True)
 
 # Configure logging
 def setup_logging():
@@ -34,7 +57,7 @@ def setup_logging():
     )
     
     # Create TimedRotatingFileHandler for daily log rotation
-    log_file = os.path.join('logs', 'app.log')
+    log_file = LOG_DIR / 'app.log'
     file_handler = TimedRotatingFileHandler(
         log_file,
         when='midnight',
@@ -50,9 +73,15 @@ def setup_logging():
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(formatter)
     
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # Request threads only enqueue records; a background listener thread
+    # does the formatting, disk writes and midnight rollover
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    
+    # Add the queue handler to logger
+    logger.addHandler(QueueHandler(log_queue))
     
     return logger
 
@@ -60,6 +89,8 @@ def setup_logging():
 logger = setup_logging()
 
 # Initialize API clients
+atexit.register(close_session)
+
 try:
     openai_client = OpenAPIClient()
     logger.info(f"OpenAI client initialized successfully (provider: {Config.OPENAI_PROVIDER})")
@@ -83,13 +114,89 @@ except Exception as e:
     excel_processor = None
 
 # File upload configuration
-ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
+ALLOWED_EXTENSIONS = ('.xlsx', '.xls')
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
+UPLOAD_CHUNK_SIZE = 64 * 1024  # 64KB
+
+# Let Werkzeug reject oversized request bodies before they are read
+app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
+
+# Background processing of uploaded files, keyed by job id
+executor = ThreadPoolExecutor(max_workers=4)
+jobs = {}
+job_finished_at = {}  # job id -> time.monotonic() at completion, in completion order
+jobs_lock = threading.Lock()
+JOB_RESULT_TTL = 60 * 60  # 1 hour
+MAX_FINISHED_JOBS = 1000
+
+# JSON API configuration
+MAX_JSON_BODY_SIZE = 1_000_000  # 1MB
+JSON_BODY_TOO_LARGE = "Request body too large. Maximum size is 1MB"
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return filename.lower().endswith(ALLOWED_EXTENSIONS)
+
+def process_upload(uploaded_file_path):
+    """Process an uploaded file in a worker thread and return the output filename"""
+    uploaded_filename = os.path.basename(uploaded_file_path)
+    try:
+        logger.info(f"Starting file processing: {uploaded_filename}")
+        output_path = excel_processor.process_uploaded_file(uploaded_file_path)
+        return os.path.basename(output_path)
+    except Exception as e:
+        logger.error(f"Error processing uploaded file: {str(e)}")
+        raise
+    finally:
+        # Clean up uploaded file
+        try:
+            os.remove(uploaded_file_path)
+            logger.info(f"Cleaned up uploaded file: {uploaded_filename}")
+        except Exception as e:
+            logger.warning(f"Failed to clean up uploaded file: {e}")
+
+def mark_job_finished(job_id):
+    """Record when a job finished so its result can be evicted later"""
+    with jobs_lock:
+        if job_id in jobs:
+            job_finished_at[job_id] = time.monotonic()
+
+def evict_finished_jobs():
+    """Drop finished jobs older than JOB_RESULT_TTL, and the oldest beyond MAX_FINISHED_JOBS"""
+    now = time.monotonic()
+    with jobs_lock:
+        expired = [job_id for job_id, finished_at in job_finished_at.items() if now - finished_at > JOB_RESULT_TTL]
+        overflow = len(job_finished_at) - len(expired) - MAX_FINISHED_JOBS
+        if overflow > 0:
+            expired.extend(list(job_finished_at)[len(expired):len(expired) + overflow])
+        for job_id in expired:
+            jobs.pop(job_id, None)
+            job_finished_at.pop(job_id, None)
+
+def parse_json_body(decoder):
+    """
+    Validate and decode a JSON request body with a msgspec decoder
+    
+    Args:
+        decoder (msgspec.json.Decoder): Decoder for the expected request type
+    
+    Returns:
+        tuple: (decoded body, None), or (None, error response) if the body is rejected
+    """
+    if not request.is_json:
+        return None, (jsonify({"error": "Content-Type must be application/json"}), 415)
+    if request.content_length and request.content_length > MAX_JSON_BODY_SIZE:
+        return None, (jsonify({"error": JSON_BODY_TOO_LARGE}), 413)
+    
+    # Chunked bodies carry no Content-Length, so the limit is also applied while reading
+    data = request.stream.read(MAX_JSON_BODY_SIZE + 1)
+    if len(data) > MAX_JSON_BODY_SIZE:
+        return None, (jsonify({"error": JSON_BODY_TOO_LARGE}), 413)
+    
+    try:
+        return decoder.decode(data), None
+    except msgspec.DecodeError as e:
+        return None, (jsonify({"error": f"Invalid request body: {str(e)}"}), 400)
 
 @app.route('/')
 def index():
@@ -103,7 +210,6 @@ def health_check():
     """
     Health check endpoint that returns a 200 status with a JSON response
     """
-    logger.info("Health check endpoint accessed")
     return jsonify({"message": "project running"}), 200
 
 @app.route('/api/upload/excel', methods=['POST'])
@@ -129,46 +235,61 @@ def upload_excel():
         if not allowed_file(file.filename):
             return jsonify({"error": "Invalid file type. Only .xlsx and .xls files are allowed"}), 400
         
-        # Check file size
-        file.seek(0, os.SEEK_END)
-        file_size = file.tell()
-        file.seek(0)
-        
-        if file_size > MAX_FILE_SIZE:
-            return jsonify({"error": "File too large. Maximum size is 16MB"}), 400
-        
         # Save uploaded file
         filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
         uploaded_filename = f"{timestamp}_{filename}"
-        uploaded_file_path = os.path.join("uploads", uploaded_filename)
+        uploaded_file_path = UPLOAD_DIR / uploaded_filename
         
-        file.save(uploaded_file_path)
+        with open(uploaded_file_path, 'wb') as out:
+            shutil.copyfileobj(file.stream, out, UPLOAD_CHUNK_SIZE)
         logger.info(f"File uploaded: {uploaded_filename}")
         
-        # Process the file
-        logger.info(f"Starting file processing: {uploaded_filename}")
-        output_path = excel_processor.process_uploaded_file(uploaded_file_path)
-        
-        # Get the filename for download
-        output_filename = os.path.basename(output_path)
-        
-        # Clean up uploaded file
-        try:
-            os.remove(uploaded_file_path)
-            logger.info(f"Cleaned up uploaded file: {uploaded_filename}")
-        except Exception as e:
-            logger.warning(f"Failed to clean up uploaded file: {e}")
+        # Process the file in the background
+        evict_finished_jobs()
+        job_id = uuid.uuid4().hex
+        future = executor.submit(process_upload, str(uploaded_file_path))
+        with jobs_lock:
+            jobs[job_id] = future
+        future.add_done_callback(lambda _: mark_job_finished(job_id))
         
         return jsonify({
-            "message": "File processed successfully",
-            "output_file": output_filename,
-            "download_url": f"/api/download/{output_filename}"
-        }), 200
+            "message": "File accepted for processing",
+            "job_id": job_id,
+            "status_url": f"/api/jobs/{job_id}"
+        }), 202
         
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
-        logger.error(f"Error processing uploaded file: {str(e)}")
-        return jsonify({"error": f"Processing failed: {str(e)}"}), 500
+        logger.error(f"Error uploading file: {str(e)}")
+        return jsonify({"error": f"Upload failed: {str(e)}"}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """
+    Endpoint to poll the status of an uploaded file being processed
+    """
+    evict_finished_jobs()
+    future = jobs.get(job_id)
+    if future is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    if not future.done():
+        return jsonify({"job_id": job_id, "status": "processing"}), 200
+    
+    error = future.exception()
+    if error is not None:
+        return jsonify({"job_id": job_id, "status": "failed", "error": f"Processing failed: {str(error)}"}), 200
+    
+    output_filename = future.result()
+    return jsonify({
+        "job_id": job_id,
+        "status": "completed",
+        "message": "File processed successfully",
+        "output_file": output_filename,
+        "download_url": f"/api/download/{output_filename}"
+    }), 200
 
 @app.route('/api/download/<filename>', methods=['GET'])
 def download_file(filename):
@@ -176,39 +297,56 @@ def download_file(filename):
     Endpoint to download processed files
     """
     try:
-        file_path = os.path.join("document", filename)
+        file_path = OUTPUT_DIR / filename
+        
+        # Let nginx stream the file with sendfile and free this worker
+        # immediately; nginx answers 404 itself if the file is gone
+        if Config.DOWNLOAD_ACCEL_REDIRECT_PREFIX:
+            logger.info(f"File downloaded: {filename}")
+            return Response(
+                mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                headers={
+                    "X-Accel-Redirect": f"{Config.DOWNLOAD_ACCEL_REDIRECT_PREFIX}/{quote(filename)}",
+                    "Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"
+                }
+            )
         
-        if not os.path.exists(file_path):
+        # Conditional responses let repeated downloads of an unchanged file return 304.
+        # The file is opened here rather than checked first, so one removed in
+        # between (by job eviction or cleanup) is still a 404, not a 500
+        try:
+            response = send_file(file_path, as_attachment=True, download_name=filename,
+                                 conditional=True, etag=True, max_age=0)
+        except (FileNotFoundError, IsADirectoryError):
             return jsonify({"error": "File not found"}), 404
         
         logger.info(f"File downloaded: {filename}")
-        return send_file(file_path, as_attachment=True, download_name=filename)
+        return response
         
     except Exception as e:
         logger.error(f"Error downloading file: {str(e)}")
         return jsonify({"error": "Download failed"}), 500
 
 @app.route('/api/openai/chat', methods=['POST'])
-def openai_chat():
+async def openai_chat():
     """
     Endpoint to make OpenAI chat completion requests
     """
     if not openai_client:
         return jsonify({"error": "OpenAI API key not configured"}), 500
     
+    body, error = parse_json_body(chat_request_decoder)
+    if error:
+        return error
+    
     try:
-        data = request.get_json()
-        
-        if not data or 'messages' not in data:
-            return jsonify({"error": "Messages are required"}), 400
-        
-        messages = data['messages']
-        temperature = data.get('temperature', 0.7)
-        max_tokens = data.get('max_tokens', 1000)
+        messages = msgspec.to_builtins(body.messages)
+        temperature = body.temperature
+        max_tokens = body.max_tokens
         
         logger.info(f"Making OpenAI chat request with {len(messages)} messages (provider: {Config.OPENAI_PROVIDER})")
         
-        response = openai_client.make_chat_completion(
+        response = await openai_client.make_chat_completion_async(
             messages=messages,
             temperature=temperature,
             max_tokens=max_tokens
@@ -220,27 +358,98 @@ def openai_chat():
         logger.error(f"OpenAI chat request failed: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/openai/chat/stream', methods=['POST'])
+def openai_chat_stream():
+    """
+    Endpoint to stream OpenAI chat completion chunks as server-sent events
+    """
+    if not openai_client:
+        return jsonify({"error": "OpenAI API key not configured"}), 500
+    
+    body, error = parse_json_body(chat_request_decoder)
+    if error:
+        return error
+    
+    messages = msgspec.to_builtins(body.messages)
+    temperature = body.temperature
+    max_tokens = body.max_tokens
+    
+    logger.info(f"Making streaming OpenAI chat request with {len(messages)} messages (provider: {Config.OPENAI_PROVIDER})")
+    
+    def generate():
+        try:
+            for chunk in openai_client.make_chat_completion_stream(
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens
+            ):
+                yield b"data: " + orjson.dumps(chunk) + b"\n\n"
+            yield b"data: [DONE]\n\n"
+        except Exception as e:
+            logger.error(f"Streaming OpenAI chat request failed: {str(e)}")
+            yield b"data: " + orjson.dumps({'error': str(e)}) + b"\n\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/api/openai/chat/batch', methods=['POST'])
+async def openai_chat_batch():
+    """
+    Endpoint to make several OpenAI chat completion requests concurrently
+    """
+    if not openai_client:
+        return jsonify({"error": "OpenAI API key not configured"}), 500
+    
+    body, error = parse_json_body(batch_chat_request_decoder)
+    if error:
+        return error
+    
+    try:
+        messages_list = msgspec.to_builtins(body.messages_list)
+        temperature = body.temperature
+        max_tokens = body.max_tokens
+        
+        logger.info(f"Making OpenAI batch chat request with {len(messages_list)} conversations (provider: {Config.OPENAI_PROVIDER})")
+        
+        results = await openai_client.make_chat_completions_batch_async(
+            messages_list=messages_list,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        
+        responses = [
+            {"error": str(result)} if isinstance(result, Exception) else result
+            for result in results
+        ]
+        return jsonify({"responses": responses}), 200
+    
+    except Exception as e:
+        logger.error(f"OpenAI batch chat request failed: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/anthropic/chat', methods=['POST'])
-def anthropic_chat():
+async def anthropic_chat():
     """
     Endpoint to make Anthropic chat requests
     """
     if not anthropic_client:
         return jsonify({"error": "Anthropic API key not configured"}), 500
     
+    body, error = parse_json_body(anthropic_chat_request_decoder)
+    if error:
+        return error
+    
     try:
-        data = request.get_json()
-        
-        if not data or 'messages' not in data:
-            return jsonify({"error": "Messages are required"}), 400
-        
-        messages = data['messages']
-        model = data.get('model', 'claude-3-sonnet-20240229')
-        max_tokens = data.get('max_tokens', 1000)
+        messages = msgspec.to_builtins(body.messages)
+        model = body.model
+        max_tokens = body.max_tokens
         
         logger.info(f"Making Anthropic chat request with {len(messages)} messages")
         
-        response = anthropic_client.make_message(
+        response = await anthropic_client.make_message_async(
             messages=messages,
             model=model,
             max_tokens=max_tokens
@@ -262,7 +471,8 @@ def api_status():
         "openai_provider": Config.OPENAI_PROVIDER,
         "anthropic_configured": anthropic_client is not None,
         "excel_processor_configured": excel_processor is not None,
-        "missing_keys": Config.validate_api_keys()
+        "missing_keys": Config.validate_api_keys(),
+        "cache_stats": openai_client.cache.stats() if openai_client else None
     }
     
     # Add provider-specific information
@@ -280,17 +490,32 @@ def api_status():
     
     return jsonify(status), 200
 
+@app.errorhandler(413)
+def request_entity_too_large(error):
+    """Return oversized requests as JSON instead of the default HTML page"""
+    if request.is_json:
+        return jsonify({"error": JSON_BODY_TOO_LARGE}), 413
+    return jsonify({"error": "File too large. Maximum size is 16MB"}), 413
+
+# Requests that are not worth a log line, such as load balancer health probes
+UNLOGGED_PATHS = {'/health'}
+
 @app.before_request
-def log_request():
-    """Log all incoming requests"""
-    logger.info(f"Request: {request.method} {request.url} from {request.remote_addr}")
+def start_request_timer():
+    """Record when the request started, for the response log line"""
+    g.t0 = time.perf_counter()
 
 @app.after_request
 def log_response(response):
-    """Log all outgoing responses"""
-    logger.info(f"Response: {response.status_code} for {request.method} {request.url}")
+    """Log each request once, with its status and duration"""
+    if request.path not in UNLOGGED_PATHS:
+        elapsed_ms = (time.perf_counter() - g.t0) * 1000
+        logger.info(f"{request.method} {request.path} -> {response.status_code} ({elapsed_ms:.1f}ms) from {request.remote_addr}")
     return response
 
 if __name__ == '__main__':
-    logger.info("Starting Flask application")
-    app.run(debug=True, host='0.0.0.0', port=5001) 
\ No newline at end of file
+    # The built-in Werkzeug server is for local development only;
+    # production runs under gunicorn (see gunicorn.conf.py). app.run reads
+    # FLASK_DEBUG, so the debugger and reloader stay opt-in
+    logger.warning("Starting Flask development server; in production run: gunicorn -c gunicorn.conf.py app:app")
+    app.run(host='0.0.0.0', port=5001)
@@ -1,47 +1,117 @@
 import os
+from dataclasses import dataclass, field
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-class Config:
-    """Configuration class for the application"""
+@dataclass(frozen=True, slots=True)
+class Settings:
+    """Configuration class for the application
+    
+    Values are read from the environment once, when the module is imported,
+    and are immutable afterwards. Everything derived from them (endpoint URLs,
+    missing API keys) is computed a single time in __post_init__.
+    """
     
     # Flask configuration
-    SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-change-this')
+    SECRET_KEY: str = os.getenv('SECRET_KEY', 'your-secret-key-change-this')
     
     # OpenAI configuration (standard OpenAI)
-    OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-    OPENAI_API_BASE = os.getenv('OPENAI_API_BASE', 'https://api.openai.com/v1')
-    OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
+    OPENAI_API_KEY: str = os.getenv('OPENAI_API_KEY')
+    OPENAI_API_BASE: str = os.getenv('OPENAI_API_BASE', 'https://api.openai.com/v1')
+    OPENAI_MODEL: str = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
     
     # Azure OpenAI configuration
-    AZURE_OPENAI_API_KEY = os.getenv('AZURE_OPENAI_API_KEY')
-    AZURE_OPENAI_ENDPOINT = os.getenv('AZURE_OPENAI_ENDPOINT')
-    AZURE_OPENAI_DEPLOYMENT = os.getenv('AZURE_OPENAI_DEPLOYMENT')
-    AZURE_OPENAI_API_VERSION = os.getenv('AZURE_OPENAI_API_VERSION', '2024-02-15-preview')
+    AZURE_OPENAI_API_KEY: str = os.getenv('AZURE_OPENAI_API_KEY')
+    AZURE_OPENAI_ENDPOINT: str = os.getenv('AZURE_OPENAI_ENDPOINT')
+    AZURE_OPENAI_DEPLOYMENT: str = os.getenv('AZURE_OPENAI_DEPLOYMENT')
+    AZURE_OPENAI_API_VERSION: str = os.getenv('AZURE_OPENAI_API_VERSION', '2024-02-15-preview')
     
     # API provider selection
-    OPENAI_PROVIDER = os.getenv('OPENAI_PROVIDER', 'openai')  # 'openai' or 'azure'
+    OPENAI_PROVIDER: str = os.getenv('OPENAI_PROVIDER', 'openai')  # 'openai' or 'azure'
+    
+    # LLM HTTP timeouts in seconds: connection setup, and the gap allowed between reads
+    LLM_CONNECT_TIMEOUT: float = float(os.getenv('LLM_CONNECT_TIMEOUT', '5'))
+    LLM_READ_TIMEOUT: float = float(os.getenv('LLM_READ_TIMEOUT', '60'))
+    
+    # Maximum number of deterministic LLM responses kept in memory
+    LLM_CACHE_SIZE: int = int(os.getenv('LLM_CACHE_SIZE', '1024'))
+    
+    # Prompt size, in characters, above which file processing warns that the
+    # request is likely to run into the model's context or output limits
+    MAX_PROMPT_CHARS: int = int(os.getenv('MAX_PROMPT_CHARS', '60000'))
+    
+    # Embedding model runtime for semantic row mapping: 'onnx' runs an ONNX
+    # export under ONNX Runtime (needs sentence-transformers[onnx]), 'torch'
+    # runs the original PyTorch weights. EMBEDDING_ONNX_FILE picks the export
+    # within the model repository; when unset, the int8 build matching the
+    # host CPU (ARM64, AVX-512 VNNI, AVX-512 or AVX2) is used
+    EMBEDDING_BACKEND: str = os.getenv('EMBEDDING_BACKEND', 'onnx')
+    EMBEDDING_ONNX_FILE: str = os.getenv('EMBEDDING_ONNX_FILE')
+    
+    # Device for the embedding model, e.g. 'cpu' or 'cuda'. When unset a CUDA
+    # GPU is used if PyTorch can see one; GPUs run the PyTorch weights, since
+    # the int8 ONNX exports are CPU builds
+    EMBEDDING_DEVICE: str = os.getenv('EMBEDDING_DEVICE')
+    
+    # CPU threads the embedding model may use per encode call (0 picks up to 8)
+    EMBEDDING_THREADS: int = int(os.getenv('EMBEDDING_THREADS', '0'))
+    
+    # Directory where embeddings of template rows are kept between runs
+    EMBEDDING_CACHE_DIR: str = os.getenv('EMBEDDING_CACHE_DIR', '.embed_cache')
+    
+    # Maximum number of uploaded row labels whose embeddings are kept in memory
+    EMBEDDING_MEMORY_CACHE_SIZE: int = int(os.getenv('EMBEDDING_MEMORY_CACHE_SIZE', '10000'))
+    
+    # PDFs with at least PDF_PARALLEL_MIN_PAGES pages have their text extracted
+    # by a pool of PDF_EXTRACT_WORKERS processes (0 uses one per CPU), each
+    # handling a contiguous range of pages
+    PDF_PARALLEL_MIN_PAGES: int = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '16'))
+    PDF_EXTRACT_WORKERS: int = int(os.getenv('PDF_EXTRACT_WORKERS', '0'))
+    
+    # When set (e.g. '/internal/document'), downloads are handed to the
+    # fronting nginx through X-Accel-Redirect instead of being sent by Flask
+    DOWNLOAD_ACCEL_REDIRECT_PREFIX: str = os.getenv('DOWNLOAD_ACCEL_REDIRECT_PREFIX')
     
     # Other API keys (add as needed)
-    ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
-    GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
+    ANTHROPIC_API_KEY: str = os.getenv('ANTHROPIC_API_KEY')
+    GOOGLE_API_KEY: str = os.getenv('GOOGLE_API_KEY')
     
-    @classmethod
-    def validate_api_keys(cls):
-        """Validate that required API keys are present"""
+    # Derived values, filled in by __post_init__
+    OPENAI_CHAT_URL: str = field(init=False)
+    OPENAI_COMPLETION_URL: str = field(init=False)
+    MISSING_KEYS: tuple = field(init=False)
+    
+    def __post_init__(self):
+        if self.OPENAI_PROVIDER == 'azure':
+            deployment_url = f"{self.AZURE_OPENAI_ENDPOINT}/openai/deployments/{self.AZURE_OPENAI_DEPLOYMENT}"
+            object.__setattr__(self, 'OPENAI_CHAT_URL', f"{deployment_url}/chat/completions")
+            object.__setattr__(self, 'OPENAI_COMPLETION_URL', f"{deployment_url}/completions")
+        else:
+            object.__setattr__(self, 'OPENAI_CHAT_URL', f"{self.OPENAI_API_BASE}/chat/completions")
+            object.__setattr__(self, 'OPENAI_COMPLETION_URL', f"{self.OPENAI_API_BASE}/completions")
+        
+        object.__setattr__(self, 'MISSING_KEYS', tuple(self._find_missing_api_keys()))
+    
+    def _find_missing_api_keys(self):
         missing_keys = []
         
-        if cls.OPENAI_PROVIDER == 'azure':
-            if not cls.AZURE_OPENAI_API_KEY:
+        if self.OPENAI_PROVIDER == 'azure':
+            if not self.AZURE_OPENAI_API_KEY:
                 missing_keys.append('AZURE_OPENAI_API_KEY')
-            if not cls.AZURE_OPENAI_ENDPOINT:
+            if not self.AZURE_OPENAI_ENDPOINT:
                 missing_keys.append('AZURE_OPENAI_ENDPOINT')
-            if not cls.AZURE_OPENAI_DEPLOYMENT:
+            if not self.AZURE_OPENAI_DEPLOYMENT:
                 missing_keys.append('AZURE_OPENAI_DEPLOYMENT')
         else:
-            if not cls.OPENAI_API_KEY:
+            if not self.OPENAI_API_KEY:
                 missing_keys.append('OPENAI_API_KEY')
         
-        return missing_keys 
\ No newline at end of file
+        return missing_keys
+    
+    def validate_api_keys(self):
+        """Validate that required API keys are present"""
+        return list(self.MISSING_KEYS)
+
+Config = Settings()
\ No newline at end of file
@@ -1,38 +1,111 @@
-import pandas as pd
-import openpyxl
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.utils.dataframe import dataframe_to_rows
-import json
+import httpx
+import orjson
 import logging
+import re
 from datetime import datetime
 import os
+from functools import lru_cache
+from itertools import zip_longest
 from api_client import OpenAPIClient
-from semantic_mapper import load_excel, extract_template_structure, match_rows, build_output
+from config import Config
+from excel_reader import analyze_template_cached, read_workbook_records
+from excel_writer import TemplateWorkbook, merge_row, row_extractor
+from json_repair import load_repaired_json
+from semantic_mapper import load_excel, extract_template_structure, frames_from_records, match_rows, build_output
 
 logger = logging.getLogger(__name__)
 
+# Uploaded sheets most likely to contain relevant data, lowercased
+_PRIORITY_SHEETS = ('p&l', 'bs', 'cash flow', 'profit & loss', 'balance sheet', 'cash flow statement')
+
+# Relevant names this short are codes such as 'bs', matched only as whole
+# tokens so that sheets like "Jobs" or "Subsidiaries" are not included
+_SHEET_CODE_MAX_LENGTH = 3
+
+# Uploaded values sent to the model are trimmed to these sizes
+_PROMPT_STRING_LIMIT = 80
+_PROMPT_FLOAT_DIGITS = 4
+
+@lru_cache(maxsize=4)
+def _semantic_template_structure(template_path, mtime):
+    """Template rows and columns for semantic mapping, cached per path and modification time"""
+    return extract_template_structure(load_excel(template_path))
+
+def _prompt_json(obj):
+    """Serialize prompt data compactly; indentation only adds tokens the model does not need"""
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+def _compact_rows(rows):
+    """
+    Trim uploaded rows for the prompt without touching the originals
+    
+    Blank cells are dropped, so columns that are empty across the slice
+    disappear entirely, floats are rounded and long strings truncated.
+    Rows left with no values are skipped.
+    
+    Args:
+        rows (list): Row dictionaries from read_excel_file
+        
+    Returns:
+        list: Compacted row dictionaries
+    """
+    compacted = []
+    for row in rows:
+        compact = {}
+        for key, value in row.items():
+            if value is None:
+                continue
+            if isinstance(value, float):
+                value = round(value, _PROMPT_FLOAT_DIGITS)
+            elif isinstance(value, str) and len(value) > _PROMPT_STRING_LIMIT:
+                value = value[:_PROMPT_STRING_LIMIT]
+            compact[key] = value
+        if compact:
+            compacted.append(compact)
+    return compacted
+
 class ExcelProcessor:
     """Process Excel files and generate formatted output using OpenAI"""
     
     def __init__(self):
         self.openai_client = OpenAPIClient()
         self.template_path = "/Users/anirudhmalik/Desktop/test_dextra/templates/Template-Waaree.xlsx/Template-Waaree.xlsx"
+        self._template = TemplateWorkbook()
 
     def process_with_semantic_mapping(self, uploaded_file_path):
-        input_data = load_excel(uploaded_file_path)
-        template_data = load_excel(self.template_path)
-        template_structure = extract_template_structure(template_data)
-
-        for sheet_name in template_structure:
-            input_sheet = input_data.get(sheet_name)
-            if input_sheet is not None:
-                template_rows = template_structure[sheet_name]["rows"]
-                input_rows = input_sheet.iloc[:, 0].dropna().astype(str).tolist()
-                row_mapping = match_rows(template_rows, input_rows)
-                processed_data = build_output(template_structure, input_data, row_mapping)
-                return processed_data
+        """
+        Map uploaded rows onto the template rows by embedding similarity
+        
+        Each template sheet is mapped from the upload sheet of the same name.
+        A partial result would leave the other sheets empty, so unless every
+        template sheet has a matching upload sheet nothing is mapped here.
+        
+        Args:
+            uploaded_file_path (str): Path to uploaded file
+            
+        Returns:
+            tuple: (processed data, or None if an upload sheet is missing;
+                the uploaded sheets as read by read_excel_file, for reuse by
+                the OpenAI fallback)
+        """
+        uploaded_data = self.read_excel_file(uploaded_file_path)
+        input_data = frames_from_records(uploaded_data)
+        template_structure = _semantic_template_structure(self.template_path, os.path.getmtime(self.template_path))
 
+        missing = [sheet_name for sheet_name in template_structure if sheet_name not in input_data]
+        if not template_structure or missing:
+            logger.info(f"Semantic mapping skipped, upload lacks template sheets: {missing}")
+            return None, uploaded_data
+        
+        processed_data = {"sheets": {}}
+        for sheet_name, meta in template_structure.items():
+            input_rows = input_data[sheet_name].iloc[:, 0].dropna().astype(str).tolist()
+            row_mapping = match_rows(meta["rows"], input_rows)
+            # Built one sheet at a time, as the same label can appear on several sheets
+            sheet_output = build_output({sheet_name: meta}, input_data, row_mapping)
+            processed_data["sheets"][sheet_name] = sheet_output["sheets"][sheet_name]
+        return processed_data, uploaded_data
 
     def read_excel_file(self, file_path):
         """
@@ -45,32 +118,7 @@ class ExcelProcessor:
             dict: Extracted data from the file
         """
         try:
-            # Read all sheets
-            excel_file = pd.ExcelFile(file_path)
-            data = {}
-            
-            for sheet_name in excel_file.sheet_names:
-                df = pd.read_excel(file_path, sheet_name=sheet_name)
-                # Convert DataFrame to records and handle NaN values
-                records = df.to_dict('records')
-                # Clean the data by replacing NaN with None and handling time objects
-                cleaned_records = []
-                for record in records:
-                    cleaned_record = {}
-                    for key, value in record.items():
-                        if pd.isna(value):
-                            cleaned_record[key] = None
-                        elif hasattr(value, 'time') or hasattr(value, 'strftime'):
-                            # Convert time/datetime objects to strings
-                            if hasattr(value, 'strftime'):
-                                cleaned_record[key] = value.strftime('%H:%M:%S')
-                            else:
-                                cleaned_record[key] = str(value)
-                        else:
-                            cleaned_record[key] = value
-                    cleaned_records.append(cleaned_record)
-                data[sheet_name] = cleaned_records
-            
+            data = read_workbook_records(file_path)
             logger.info(f"Successfully read Excel file: {file_path}")
             return data
             
@@ -86,34 +134,8 @@ class ExcelProcessor:
             dict: Template structure information
         """
         try:
-            template_data = self.read_excel_file(self.template_path)
-            
-            # Analyze structure
-            structure = {
-                "sheets": {},
-                "headers": {},
-                "data_types": {},
-                "template_rows": {}
-            }
-            
-            for sheet_name, data in template_data.items():
-                if data:
-                    structure["sheets"][sheet_name] = {
-                        "columns": list(data[0].keys()),
-                        "row_count": len(data)
-                    }
-                    
-                    # Include actual template rows so OpenAI knows which rows to map to
-                    structure["template_rows"][sheet_name] = data
-                    
-                    # Analyze data types and convert to JSON-serializable format
-                    df = pd.DataFrame(data)
-                    dtypes_dict = {}
-                    for col, dtype in df.dtypes.items():
-                        # Convert pandas dtype to string representation
-                        dtypes_dict[str(col)] = str(dtype)
-                    structure["data_types"][sheet_name] = dtypes_dict
-            
+            stat = os.stat(self.template_path)
+            structure = analyze_template_cached(self.template_path, stat.st_mtime, stat.st_size)
             logger.info("Template analysis completed")
             return structure
             
@@ -158,14 +180,15 @@ class ExcelProcessor:
                 # Limit to maximum 10 rows to keep prompt manageable
                 simplified_template["template_rows"][sheet_name] = key_rows[:10]
         
+        # Both parts are serialized in one pass, under the names the instructions use
+        payload = {"template_structure": simplified_template, "uploaded_data": filtered_data}
+        
         prompt = f"""
 You are an Excel data processing expert. I need you to process uploaded data and format it according to a specific template structure.
 
-TEMPLATE STRUCTURE (SIMPLIFIED):
-{json.dumps(simplified_template, indent=2)}
-
-UPLOADED DATA (FILTERED FOR RELEVANT SHEETS):
-{json.dumps(filtered_data, indent=2)}
+TEMPLATE STRUCTURE AND UPLOADED DATA:
+"template_structure" holds the simplified template and "uploaded_data" the uploaded data, filtered for relevant sheets.
+{_prompt_json(payload)}
 
 INSTRUCTIONS:
 1. Use the template structure shown above as your reference for the output format.
@@ -222,24 +245,28 @@ Return only the JSON data, no additional text or explanations.
         Returns:
             dict: Filtered data
         """
-        template_sheets = set(template_structure.get('sheets', {}).keys())
+        template_sheets = {name.lower() for name in template_structure.get('sheets', {})}
         filtered_data = {}
         
-        # Priority sheets that are most likely to contain relevant data
-        priority_sheets = ['P&L', 'BS', 'Cash Flow', 'Profit & Loss', 'Balance Sheet', 'Cash Flow Statement','p&l']
+        # Names that mark a sheet as relevant, compared case-insensitively: the
+        # priority sheets most likely to contain relevant data, and the
+        # template's own sheets. Short codes must appear as a whole token
+        # (between non-alphanumerics); longer names anywhere in the sheet name
+        relevant_names = _PRIORITY_SHEETS + tuple(template_sheets)
+        codes = [name for name in relevant_names if len(name) <= _SHEET_CODE_MAX_LENGTH]
+        long_names = [name for name in relevant_names if len(name) > _SHEET_CODE_MAX_LENGTH]
+        code_re = re.compile(r'(?<![a-z0-9])(?:%s)(?![a-z0-9])' % '|'.join(map(re.escape, codes)))
         
         for sheet_name, data in uploaded_data.items():
             # Check if this sheet matches template sheets or priority sheets
-            is_relevant = (
-                sheet_name in template_sheets or
-                any(priority in sheet_name for priority in priority_sheets) or
-                any(template_sheet in sheet_name for template_sheet in template_sheets)
-            )
+            name_lc = sheet_name.lower()
+            is_relevant = (name_lc in template_sheets or code_re.search(name_lc) is not None
+                           or any(name in name_lc for name in long_names))
             
             if is_relevant and data:
                 # Limit the number of rows to prevent token limit issues
                 max_rows = 20  # Reduced to 20 rows per sheet to prevent token limit issues
-                filtered_data[sheet_name] = data[:max_rows]
+                filtered_data[sheet_name] = _compact_rows(data[:max_rows])
                 logger.info(f"Included sheet '{sheet_name}' with {len(filtered_data[sheet_name])} rows (limited from {len(data)})")
             elif data:
                 logger.info(f"Skipped sheet '{sheet_name}' (not relevant to template)")
@@ -249,11 +276,47 @@ Return only the JSON data, no additional text or explanations.
             logger.warning("No relevant sheets found, including first 3 sheets with limited data")
             for i, (sheet_name, data) in enumerate(uploaded_data.items()):
                 if i < 3 and data:  # Only first 3 sheets
-                    filtered_data[sheet_name] = data[:10]  # Reduced to 10 rows
+                    filtered_data[sheet_name] = _compact_rows(data[:10])  # Reduced to 10 rows
                     logger.info(f"Included fallback sheet '{sheet_name}' with {len(filtered_data[sheet_name])} rows")
         
         return filtered_data
     
+    def _request_completion_content(self, messages, temperature, max_tokens):
+        """
+        Get the full text of a chat completion, streamed as it is generated
+        
+        Long JSON responses take a while to generate; streaming keeps the
+        connection active the whole time instead of waiting on one large
+        read. If the stream fails, the request is repeated in buffered mode.
+        
+        Args:
+            messages (list): List of message dictionaries
+            temperature (float): Sampling temperature
+            max_tokens (int): Maximum tokens to generate
+            
+        Returns:
+            tuple: (content, finish_reason)
+        """
+        try:
+            parts = []
+            finish_reason = None
+            for chunk in self.openai_client.make_chat_completion_stream(messages, temperature=temperature, max_tokens=max_tokens):
+                # Azure sends chunks without choices, e.g. for content filter results
+                if not chunk.get('choices'):
+                    continue
+                choice = chunk['choices'][0]
+                delta = choice.get('delta', {}).get('content')
+                if delta:
+                    parts.append(delta)
+                finish_reason = choice.get('finish_reason') or finish_reason
+            return ''.join(parts), finish_reason
+        except (httpx.HTTPError, orjson.JSONDecodeError, KeyError, IndexError, AttributeError) as e:
+            logger.warning(f"Streaming OpenAI request failed ({str(e)}), retrying without streaming")
+        
+        response = self.openai_client.make_chat_completion(messages=messages, temperature=temperature, max_tokens=max_tokens)
+        choice = response['choices'][0]
+        return choice['message']['content'], choice.get('finish_reason')
+    
     def process_with_openai(self, uploaded_data, template_structure):
         """
         Process uploaded data using OpenAI
@@ -268,6 +331,8 @@ Return only the JSON data, no additional text or explanations.
         try:
             prompt = self.create_openai_prompt(uploaded_data, template_structure)
             logger.info(f"Created OpenAI prompt (length: {len(prompt)} characters)")
+            if len(prompt) > Config.MAX_PROMPT_CHARS:
+                logger.warning(f"OpenAI prompt exceeds MAX_PROMPT_CHARS ({len(prompt)} > {Config.MAX_PROMPT_CHARS}); the response may be truncated")
             
             messages = [
                 {"role": "system", "content": "You are an Excel data processing expert. Process the data and return only valid JSON. Do not include any markdown formatting or code blocks."},
@@ -275,43 +340,28 @@ Return only the JSON data, no additional text or explanations.
             ]
             
             logger.info("Sending data to OpenAI for processing")
-            response = self.openai_client.make_chat_completion(
-                messages=messages,
+            content, finish_reason = self._request_completion_content(
+                messages,
                 temperature=0.1,  # Low temperature for consistent formatting
                 max_tokens=16000  # Further increased for very large JSON responses
             )
-            
-            # Extract the response content
-            content = response['choices'][0]['message']['content']
             logger.info(f"OpenAI response received (length: {len(content)} characters)")
-            logger.info(f"OpenAI response preview: {content[:200]}...")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("OpenAI response preview: %s...", content[:200])
             
             # Check if response was truncated
-            if response['choices'][0].get('finish_reason') == 'length':
+            if finish_reason == 'length':
                 logger.warning("OpenAI response was truncated due to token limit")
                 logger.warning("Consider reducing the amount of data sent or increasing max_tokens")
             
             # Try to parse JSON from the response
             try:
-                # Clean the response to extract JSON
-                content = content.strip()
-                
-                # Remove markdown code blocks
-                if content.startswith('```json'):
-                    content = content[7:]
-                elif content.startswith('```'):
-                    content = content[3:]
-                if content.endswith('```'):
-                    content = content[:-3]
-                
-                # Remove any leading/trailing whitespace
-                content = content.strip()
-                
-                # Try to find JSON object boundaries if there's extra text
+                # Slice out the outermost JSON object; this also drops markdown
+                # code fences and any text around the object in one pass
                 start_idx = content.find('{')
                 end_idx = content.rfind('}')
                 
-                if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
+                if start_idx != -1 and end_idx > start_idx:
                     content = content[start_idx:end_idx + 1]
                 
                 # Check if JSON appears to be complete
@@ -321,19 +371,20 @@ Return only the JSON data, no additional text or explanations.
                     raise ValueError("Incomplete JSON response - likely truncated")
                 
                 logger.info(f"Cleaned response (length: {len(content)} characters)")
-                logger.info(f"Cleaned response preview: {content[:200]}...")
-                logger.info(f"Cleaned response end: ...{content[-200:]}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Cleaned response preview: %s...", content[:200])
+                    logger.debug("Cleaned response end: ...%s", content[-200:])
                 
                 # Try to parse the JSON
-                processed_data = json.loads(content)
+                processed_data = orjson.loads(content)
                 logger.info(f"Successfully parsed JSON. Keys: {list(processed_data.keys())}")
                 
                 # Validate the processed data structure
                 for sheet_name, data in processed_data.items():
                     if isinstance(data, list):
-                        logger.info(f"Sheet '{sheet_name}' has {len(data)} rows")
-                        if data:
-                            logger.info(f"First row keys: {list(data[0].keys()) if data[0] else 'No keys'}")
+                        logger.debug("Sheet '%s' has %d rows", sheet_name, len(data))
+                        if data and logger.isEnabledFor(logging.DEBUG):
+                            logger.debug("First row keys: %s", list(data[0].keys()) if data[0] else 'No keys')
                     else:
                         logger.warning(f"Sheet '{sheet_name}' is not a list: {type(data)}")
                 
@@ -343,7 +394,7 @@ Return only the JSON data, no additional text or explanations.
                     for sheet_name, processed_rows in processed_data['sheets'].items():
                         if sheet_name in template_structure.get('template_rows', {}):
                             template_rows = template_structure['template_rows'][sheet_name]
-                            logger.info(f"Validating sheet '{sheet_name}': processed={len(processed_rows)} rows, template={len(template_rows)} rows")
+                            logger.debug("Validating sheet '%s': processed=%d rows, template=%d rows", sheet_name, len(processed_rows), len(template_rows))
                             
                             if len(processed_rows) != len(template_rows):
                                 logger.warning(f"Row count mismatch in sheet '{sheet_name}': processed has {len(processed_rows)} rows, template has {len(template_rows)} rows")
@@ -362,7 +413,7 @@ Return only the JSON data, no additional text or explanations.
                 logger.info("Successfully processed data with OpenAI")
                 return processed_data
                 
-            except json.JSONDecodeError as e:
+            except orjson.JSONDecodeError as e:
                 logger.error(f"Failed to parse OpenAI response as JSON: {str(e)}")
                 logger.error(f"Error position: {e.pos}")
                 logger.error(f"Error line: {e.lineno}, column: {e.colno}")
@@ -377,19 +428,12 @@ Return only the JSON data, no additional text or explanations.
                 # Try to fix common JSON issues
                 logger.info("Attempting to fix common JSON issues...")
                 try:
-                    # Try to fix trailing commas
-                    import re
-                    fixed_content = re.sub(r',(\s*[}\]])', r'\1', content)
-                    
-                    # Try to fix unquoted keys
-                    fixed_content = re.sub(r'(\s*)(\w+)(\s*):', r'\1"\2"\3:', fixed_content)
-                    
                     logger.info("Attempting to parse fixed JSON...")
-                    processed_data = json.loads(fixed_content)
+                    processed_data = load_repaired_json(content)
                     logger.info("Successfully parsed JSON after fixing common issues")
                     return processed_data
                     
-                except json.JSONDecodeError as e2:
+                except ValueError as e2:
                     logger.error(f"Failed to parse even after fixing common issues: {str(e2)}")
                     raise ValueError("OpenAI response is not valid JSON and could not be fixed")
                 
@@ -409,16 +453,9 @@ Return only the JSON data, no additional text or explanations.
             str: Path to the created file
         """
         try:
-            # Load template
-            template_wb = openpyxl.load_workbook(self.template_path)
-            logger.info(f"Template loaded with sheets: {template_wb.sheetnames}")
-            
-            # Create new workbook
-            output_wb = Workbook()
-            
-            # Get the default sheet name
-            default_sheet_name = output_wb.sheetnames[0]
-            logger.info(f"Default sheet name: {default_sheet_name}")
+            # Create new workbook; rows are streamed to disk as they are appended
+            output_wb = Workbook(write_only=True)
+            style_cache = {}
             
             # Check if processed_data has the expected structure
             if 'sheets' not in processed_data:
@@ -429,106 +466,57 @@ Return only the JSON data, no additional text or explanations.
             sheet_data = processed_data['sheets']
             logger.info(f"Sheet data keys: {list(sheet_data.keys())}")
             
-            # Copy template structure and apply data
-            for sheet_name in template_wb.sheetnames:
-                logger.info(f"Processing sheet: {sheet_name}")
-                
-                if sheet_name in sheet_data:
-                    logger.info(f"Found processed data for sheet: {sheet_name}")
-                    sheet_rows = sheet_data[sheet_name]
-                    logger.info(f"Sheet '{sheet_name}' has {len(sheet_rows)} rows")
-                    
-                    # Create new sheet or use existing
-                    if sheet_name in output_wb.sheetnames:
-                        output_ws = output_wb[sheet_name]
-                        logger.info(f"Using existing sheet: {sheet_name}")
-                    else:
-                        # If this is the first sheet, rename the default sheet
-                        if len(output_wb.sheetnames) == 1 and output_wb.sheetnames[0] == default_sheet_name:
-                            output_wb.active.title = sheet_name
-                            output_ws = output_wb.active
-                            logger.info(f"Renamed default sheet to: {sheet_name}")
-                        else:
-                            output_ws = output_wb.create_sheet(sheet_name)
-                            logger.info(f"Created new sheet: {sheet_name}")
-                    
-                    # Copy template sheet
-                    template_ws = template_wb[sheet_name]
-                    logger.info(f"Template sheet dimensions: {template_ws.max_row} rows x {template_ws.max_column} columns")
+            # The template is held open for reading until every sheet is copied
+            with self._template.use(self.template_path) as template_wb:
+                # Copy template structure and apply data
+                for sheet_name in template_wb.sheetnames:
+                    logger.debug("Processing sheet: %s", sheet_name)
                     
-                    # Copy formatting and structure from template
-                    for row in template_ws.iter_rows():
-                        for cell in row:
-                            new_cell = output_ws.cell(row=cell.row, column=cell.column)
-                            new_cell.value = cell.value
-                            
-                            # Copy formatting
-                            if cell.font:
-                                new_cell.font = Font(
-                                    name=cell.font.name,
-                                    size=cell.font.size,
-                                    bold=cell.font.bold,
-                                    italic=cell.font.italic,
-                                    color=cell.font.color
-                                )
-                            
-                            if cell.alignment:
-                                new_cell.alignment = Alignment(
-                                    horizontal=cell.alignment.horizontal,
-                                    vertical=cell.alignment.vertical,
-                                    wrap_text=cell.alignment.wrap_text
-                                )
-                            
-                            if cell.fill:
-                                new_cell.fill = PatternFill(
-                                    fill_type=cell.fill.fill_type,
-                                    start_color=cell.fill.start_color,
-                                    end_color=cell.fill.end_color
-                                )
-                    
-                    # Apply processed data
-                    if sheet_rows and len(sheet_rows) > 0:
-                        logger.info(f"Applying {len(sheet_rows)} rows of data to sheet: {sheet_name}")
+                    if sheet_name in sheet_data:
+                        logger.debug("Found processed data for sheet: %s", sheet_name)
+                        sheet_rows = sheet_data[sheet_name]
+                        logger.debug("Sheet '%s' has %d rows", sheet_name, len(sheet_rows))
                         
-                        # Get the column headers from the first row of processed data
-                        if isinstance(sheet_rows[0], dict):
-                            headers = list(sheet_rows[0].keys())
-                            logger.info(f"Data headers: {headers}")
-                            
-                            # Write headers to first row
-                            for col_idx, header in enumerate(headers, 1):
-                                cell = output_ws.cell(row=1, column=col_idx)
-                                cell.value = header
-                                logger.info(f"Writing header '{header}' to cell {1}:{col_idx}")
+                        output_ws = output_wb.create_sheet(sheet_name)
+                        logger.debug("Created new sheet: %s", sheet_name)
+                        
+                        template_ws = template_wb[sheet_name]
+                        logger.debug("Template sheet dimensions: %s rows x %s columns", template_ws.max_row, template_ws.max_column)
+                        
+                        # Values written over the template: headers in the first row, data from row 2
+                        data_rows = []
+                        if sheet_rows and len(sheet_rows) > 0:
+                            logger.debug("Applying %d rows of data to sheet: %s", len(sheet_rows), sheet_name)
                             
-                            # Write data starting from row 2
-                            for row_idx, row_data in enumerate(sheet_rows, 2):
-                                logger.info(f"Writing row {row_idx}: {row_data}")
-                                for col_idx, (col_name, value) in enumerate(row_data.items(), 1):
-                                    cell = output_ws.cell(row=row_idx, column=col_idx)
+                            # Get the column headers from the first row of processed data
+                            if isinstance(sheet_rows[0], dict):
+                                headers = list(sheet_rows[0].keys())
+                                logger.debug("Data headers: %s", headers)
+                                
+                                data_rows.append(headers)
+                                row_values = row_extractor(headers)
+                                for row_data in sheet_rows:
                                     # Handle None values
-                                    if value is None:
-                                        cell.value = ""
-                                    else:
-                                        cell.value = value
-                                    logger.info(f"Writing '{value}' to cell {row_idx}:{col_idx}")
+                                    data_rows.append(["" if value is None else value for value in row_values(row_data)])
+                            else:
+                                logger.warning(f"Sheet data is not in expected format. First row type: {type(sheet_rows[0])}")
                         else:
-                            logger.warning(f"Sheet data is not in expected format. First row type: {type(sheet_rows[0])}")
+                            logger.warning(f"No processed data found for sheet: {sheet_name}")
+                        
+                        # Write-only sheets are filled row by row, so each template row is
+                        # merged with the data written over it before it is appended
+                        for template_row, values in zip_longest(template_ws.iter_rows(), data_rows, fillvalue=()):
+                            output_ws.append(merge_row(output_ws, template_row, values, style_cache))
+                        if data_rows:
+                            logger.debug("Wrote %d rows x %d columns to sheet: %s", len(sheet_rows), len(data_rows[0]), sheet_name)
                     else:
-                        logger.warning(f"No processed data found for sheet: {sheet_name}")
-                else:
-                    logger.warning(f"No processed data found for template sheet: {sheet_name}")
-            
-            # Remove the default sheet only if we have other sheets
-            if len(output_wb.sheetnames) > 1 and default_sheet_name in output_wb.sheetnames:
-                output_wb.remove(output_wb[default_sheet_name])
-                logger.info(f"Removed default sheet: {default_sheet_name}")
+                        logger.warning(f"No processed data found for template sheet: {sheet_name}")
             
             # Ensure we have at least one sheet
             if len(output_wb.sheetnames) == 0:
                 # Create a default sheet if no sheets exist
-                output_wb.create_sheet("Sheet1")
-                logger.warning("No sheets were created, added default Sheet1")
+                output_wb.create_sheet("Sheet")
+                logger.warning("No sheets were created, added default Sheet")
             
             logger.info(f"Final workbook sheets: {output_wb.sheetnames}")
             
@@ -538,11 +526,8 @@ Return only the JSON data, no additional text or explanations.
             
             return output_path
             
-        except Exception as e:
-            logger.error(f"Error creating formatted Excel: {str(e)}")
-            logger.error(f"Exception type: {type(e)}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+        except Exception:
+            logger.exception("Error creating formatted Excel")
             raise
     
     def process_uploaded_file(self, uploaded_file_path):
@@ -558,33 +543,40 @@ Return only the JSON data, no additional text or explanations.
         try:
             logger.info(f"Processing uploaded file: {uploaded_file_path}")
             
-            # Read uploaded file
-            uploaded_data = self.read_excel_file(uploaded_file_path)
+            # Map rows by embedding similarity; the sheets read here are reused
+            # if the upload has no template sheet and OpenAI is needed instead
+            processed_data, uploaded_data = self.process_with_semantic_mapping(uploaded_file_path)
             logger.info(f"Uploaded data sheets: {list(uploaded_data.keys())}")
             for sheet_name, data in uploaded_data.items():
-                logger.info(f"Sheet '{sheet_name}' has {len(data)} rows")
+                logger.debug("Sheet '%s' has %d rows", sheet_name, len(data))
                 if data:
-                    logger.info(f"Sample data from '{sheet_name}': {data[0] if data else 'No data'}")
+                    logger.debug("Sample data from '%s': %s", sheet_name, data[0])
             
-            # Analyze template
-            template_structure = self.analyze_template()
-            logger.info(f"Template structure: {json.dumps(template_structure, indent=2)}")
+            if processed_data is not None:
+                logger.info("Semantic mapping completed")
+            else:
+                logger.info("Falling back to OpenAI")
             
-            # Process with OpenAI
-            logger.info("Starting OpenAI processing...")
-            processed_data = self.process_with_openai(uploaded_data, template_structure)
-            logger.info(f"OpenAI processing completed. Processed data keys: {list(processed_data.keys())}")
+                # Analyze template
+                template_structure = self.analyze_template()
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Template structure: %s", orjson.dumps(template_structure, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode())
+                
+                # Process with OpenAI
+                logger.info("Starting OpenAI processing...")
+                processed_data = self.process_with_openai(uploaded_data, template_structure)
+                logger.info(f"OpenAI processing completed. Processed data keys: {list(processed_data.keys())}")
             
             # Log processed data structure
             if 'sheets' in processed_data:
                 sheet_data = processed_data['sheets']
                 for sheet_name, data in sheet_data.items():
                     if isinstance(data, list):
-                        logger.info(f"Processed sheet '{sheet_name}' has {len(data)} rows")
+                        logger.debug("Processed sheet '%s' has %d rows", sheet_name, len(data))
                         if data:
-                            logger.info(f"Processed data sample from '{sheet_name}': {data[0] if data else 'No data'}")
+                            logger.debug("Processed data sample from '%s': %s", sheet_name, data[0])
                     else:
-                        logger.info(f"Processed sheet '{sheet_name}' has structure: {type(data)}")
+                        logger.debug("Processed sheet '%s' has structure: %s", sheet_name, type(data))
             else:
                 logger.warning("No 'sheets' key found in processed data")
             
@@ -600,9 +592,6 @@ Return only the JSON data, no additional text or explanations.
             logger.info(f"File processing completed: {output_path}")
             return output_path
             
-        except Exception as e:
-            logger.error(f"Error processing uploaded file: {str(e)}")
-            logger.error(f"Exception type: {type(e)}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+        except Exception:
+            logger.exception("Error processing uploaded file")
             raise 
\ No newline at end of file
@@ -0,0 +1,240 @@
+import logging
+from functools import lru_cache
+from datetime import date, time
+import openpyxl
+
+try:
+    import python_calamine
+except ImportError:  # optional, Rust-based reader that parses workbooks much faster than openpyxl
+    python_calamine = None
+
+logger = logging.getLogger(__name__)
+
+# Workbook reading shared by the processors: sheets are streamed through
+# openpyxl in read-only mode into the same row dictionaries that
+# pandas.read_excel(...).to_dict('records') used to produce
+
+# Cell text that pandas.read_excel treats as missing by default
+_NA_STRINGS = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+])
+
+def _header_names(header_row, width):
+    """
+    Build column names from a sheet's first row the way pandas does
+    
+    Blank headers become "Unnamed: <index>" and repeated names get ".1", ".2", ... suffixes.
+    
+    Args:
+        header_row (tuple): Values of the first row
+        width (int): Number of columns in the sheet
+        
+    Returns:
+        list: Column names
+    """
+    names = []
+    seen = set()
+    for idx in range(width):
+        value = header_row[idx] if idx < len(header_row) else None
+        name = f"Unnamed: {idx}" if value is None else value
+        if name in seen:
+            suffix = 1
+            while f"{name}.{suffix}" in seen:
+                suffix += 1
+            name = f"{name}.{suffix}"
+        seen.add(name)
+        names.append(name)
+    return names
+
+def _clean_value(value):
+    """Convert a raw cell value to what the prompt expects: None for blanks, strings for times"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return None if value in _NA_STRINGS else value
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else value
+    if isinstance(value, (date, time)):
+        # Convert time/datetime objects to strings
+        return value.strftime('%H:%M:%S')
+    return value
+
+def infer_dtype(values):
+    """
+    Name the dtype pandas would infer for a column of cleaned cell values
+    
+    Args:
+        values (list): Column values, None for blanks
+    
+    Returns:
+        str: 'int64', 'float64', 'bool' or 'object'
+    """
+    kinds = set()
+    has_blank = False
+    for value in values:
+        if value is None:
+            has_blank = True
+        elif isinstance(value, bool):
+            kinds.add(bool)
+        elif isinstance(value, int):
+            if not -2**63 <= value < 2**63:
+                return 'object'
+            kinds.add(int)
+        elif isinstance(value, float):
+            kinds.add(float)
+        else:
+            return 'object'
+    
+    if kinds == {bool}:
+        return 'object' if has_blank else 'bool'
+    if kinds == {int} and not has_blank:
+        return 'int64'
+    if kinds and bool not in kinds:
+        # Blanks become NaN, which turns integer columns into floats
+        return 'float64'
+    return 'object'
+
+def read_sheet_records(ws):
+    """
+    Read a read-only worksheet into row dictionaries keyed by the header row
+    
+    Trailing empty rows and columns are dropped, as pandas.read_excel does.
+    
+    Args:
+        ws: openpyxl read-only worksheet
+        
+    Returns:
+        list: One dict per data row
+    """
+    # The stored dimensions can be stale; read whatever rows the sheet actually has
+    ws.reset_dimensions()
+    return _rows_to_records(ws.iter_rows(values_only=True))
+    
+def _rows_to_records(sheet_rows):
+    """
+    Turn a sheet's rows of raw values into row dictionaries keyed by the header row
+    
+    Args:
+        sheet_rows (iterable): Row value sequences, starting at the sheet's first row
+        
+    Returns:
+        list: One dict per data row
+    """
+    rows = []
+    width = 0
+    row_count = 0
+    for row in sheet_rows:
+        rows.append(row)
+        length = len(row)
+        while length and row[length - 1] is None:
+            length -= 1
+        if length:
+            width = max(width, length)
+            row_count = len(rows)
+    
+    if not row_count:
+        return []
+    
+    headers = _header_names(rows[0], width)
+    records = []
+    for row in rows[1:row_count]:
+        if len(row) < width:
+            row = tuple(row) + (None,) * (width - len(row))
+        records.append({header: _clean_value(value) for header, value in zip(headers, row)})
+    return records
+
+def read_workbook_records(file_path):
+    """
+    Read every sheet of a workbook into row dictionaries
+    
+    Args:
+        file_path (str): Path to the Excel file
+        
+    Returns:
+        dict: Sheet name -> list of row dicts
+    """
+    if python_calamine is not None:
+        try:
+            return _read_calamine_records(file_path)
+        except python_calamine.CalamineError as e:
+            logger.warning(f"calamine could not read {file_path} ({str(e)}), falling back to openpyxl")
+    
+    # Stream all sheets row by row instead of building DataFrames
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        return {sheet_name: read_sheet_records(workbook[sheet_name]) for sheet_name in workbook.sheetnames}
+    finally:
+        workbook.close()
+
+def _calamine_value(value):
+    """Map a calamine cell value to what openpyxl returns: None for blanks, int for whole numbers"""
+    if value == '':
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def _read_calamine_records(file_path):
+    """
+    Read every sheet of a workbook into row dictionaries with python-calamine
+    
+    Args:
+        file_path (str): Path to the Excel file
+        
+    Returns:
+        dict: Sheet name -> list of row dicts
+    """
+    workbook = python_calamine.CalamineWorkbook.from_path(file_path)
+    try:
+        data = {}
+        for sheet_name in workbook.sheet_names:
+            # skip_empty_area=False keeps leading blank rows and columns, as openpyxl does
+            rows = workbook.get_sheet_by_name(sheet_name).to_python(skip_empty_area=False)
+            data[sheet_name] = _rows_to_records([_calamine_value(value) for value in row] for row in rows)
+        return data
+    finally:
+        workbook.close()
+
+@lru_cache(maxsize=4)
+def analyze_template_cached(template_path, mtime, size):
+    """
+    Analyze a template file, cached until the file's modification time or size changes
+    
+    The returned structure is shared between calls and must not be modified.
+    
+    Args:
+        template_path (str): Path to the template file
+        mtime (float): Modification time of the file
+        size (int): Size of the file in bytes
+    
+    Returns:
+        dict: Template structure information
+    """
+    template_data = read_workbook_records(template_path)
+    
+    # Analyze structure
+    structure = {
+        "sheets": {},
+        "headers": {},
+        "data_types": {},
+        "template_rows": {}
+    }
+    
+    for sheet_name, data in template_data.items():
+        if data:
+            structure["sheets"][sheet_name] = {
+                "columns": list(data[0].keys()),
+                "row_count": len(data)
+            }
+            
+            # Include actual template rows so OpenAI knows which rows to map to
+            structure["template_rows"][sheet_name] = data
+            
+            # Name each column's data type without building a DataFrame
+            structure["data_types"][sheet_name] = {
+                str(col): infer_dtype([row[col] for row in data]) for col in data[0]
+            }
+    
+    logger.info(f"Template analyzed: {template_path}")
+    return structure
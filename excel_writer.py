@@ -0,0 +1,151 @@
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from copy import copy
+from operator import itemgetter
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.read_only import EmptyCell
+
+# Output-side helpers shared by the processors for copying template
+# formatting into generated workbooks
+
+logger = logging.getLogger(__name__)
+
+class TemplateWorkbook:
+    """Read-only template workbook, shared by all requests until the file changes"""
+    
+    def __init__(self):
+        self._wb = None
+        self._key = None
+        self._users = {}  # id(workbook) -> requests currently reading it
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def use(self, template_path):
+        """
+        Yield the template workbook, reloading it if the path or file changed
+        
+        Loaded with data_only=False so formulas are copied into the output.
+        Worksheets open their own stream from it on each pass, so concurrent
+        requests can iterate the same sheet. A read-only workbook holds its zip
+        file open until closed, so a replaced workbook is closed as soon as the
+        last request reading it is done.
+        
+        Args:
+            template_path (str): Path to the template file
+            
+        Yields:
+            Workbook: The template workbook
+        """
+        key = (template_path, os.path.getmtime(template_path))
+        with self._lock:
+            if self._wb is None or key != self._key:
+                replaced = self._wb
+                self._wb = openpyxl.load_workbook(template_path, read_only=True, keep_links=False)
+                self._key = key
+                logger.info(f"Template loaded with sheets: {self._wb.sheetnames}")
+                if replaced is not None and id(replaced) not in self._users:
+                    replaced.close()
+            workbook = self._wb
+            self._users[id(workbook)] = self._users.get(id(workbook), 0) + 1
+        
+        try:
+            yield workbook
+        finally:
+            with self._lock:
+                self._users[id(workbook)] -= 1
+                if not self._users[id(workbook)]:
+                    del self._users[id(workbook)]
+                    if workbook is not self._wb:
+                        workbook.close()
+
+def copy_style(source_cell, target_cell, style_cache):
+    """
+    Give target_cell the full style of source_cell from another workbook
+    
+    A cell's style is a set of indexes into its own workbook's style tables, so
+    it cannot be shared across workbooks as-is. Each distinct source style is
+    registered in the target workbook once; later cells with the same style
+    only copy the resulting index array.
+    
+    Args:
+        source_cell: Cell from the template workbook, regular or read-only
+        target_cell: Cell in the output workbook
+        style_cache (dict): Source style array -> target style array, per output workbook
+    """
+    # Read-only cells expose their style indexes as style_array, regular cells as _style
+    key = tuple(source_cell.style_array if hasattr(source_cell, 'style_array') else source_cell._style)
+    style = style_cache.get(key)
+    if style is None:
+        target_cell.font = copy(source_cell.font)
+        target_cell.fill = copy(source_cell.fill)
+        target_cell.border = copy(source_cell.border)
+        target_cell.alignment = copy(source_cell.alignment)
+        target_cell.protection = copy(source_cell.protection)
+        target_cell.number_format = source_cell.number_format
+        style_cache[key] = copy(target_cell._style)
+    else:
+        target_cell._style = copy(style)
+
+def row_extractor(headers):
+    """
+    Build a function returning a row dict's values in header order
+    
+    Rows from the model normally repeat the first row's keys, so values are
+    fetched with a single itemgetter call; a row missing some of the keys
+    falls back to None for them. Keys not among the headers are ignored.
+    
+    Args:
+        headers (list): Column names, in output order
+        
+    Returns:
+        callable: row dict -> list of values
+    """
+    if not headers:
+        return lambda row: []
+    getter = itemgetter(*headers)
+    single = len(headers) == 1
+    
+    def extract(row):
+        try:
+            values = getter(row)
+        except KeyError:
+            return [row.get(header) for header in headers]
+        return [values] if single else list(values)
+    
+    return extract
+
+def merge_row(output_ws, template_row, values, style_cache):
+    """
+    Build one output row from a template row and the values written over it
+    
+    Values take the place of the template's values position by position; the
+    template keeps its values past the end of them, and every position keeps
+    the template cell's style.
+    
+    Args:
+        output_ws: Worksheet the row is appended to, regular or write-only
+        template_row (tuple): Cells of the template row, empty past the template's end
+        values (list): Values written over the row, empty if none
+        style_cache (dict): Source style array -> target style array, see copy_style
+        
+    Returns:
+        list: Values and styled cells ready for append
+    """
+    row = []
+    for col_idx in range(max(len(template_row), len(values))):
+        source = template_row[col_idx] if col_idx < len(template_row) else None
+        if col_idx < len(values):
+            value = values[col_idx]
+        else:
+            value = source.value if source is not None else None
+        # Cells missing from the sheet XML have neither value nor style
+        if source is None or isinstance(source, EmptyCell) or not source.has_style:
+            row.append(value)
+        else:
+            cell = WriteOnlyCell(output_ws, value=value)
+            copy_style(source, cell, style_cache)
+            row.append(cell)
+    return row
@@ -1,24 +1,92 @@
-import pandas as pd
-import openpyxl
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.utils.dataframe import dataframe_to_rows
-import json
+import orjson
 import logging
 from datetime import datetime
 import os
 import PyPDF2
 import re
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat, zip_longest
 from api_client import OpenAPIClient
+from config import Config
+from excel_reader import analyze_template_cached, read_workbook_records
+from excel_writer import TemplateWorkbook, merge_row, row_extractor
+from json_repair import load_repaired_json
+
+try:
+    import pymupdf
+except ImportError:  # optional, much faster PDF text extraction than PyPDF2
+    pymupdf = None
 
 logger = logging.getLogger(__name__)
 
+# Section headers recognised in PDF text, checked in this order. Each branch
+# looks ahead over the whole line, so a single match call keeps the
+# first-listed section winning when a line names several
+_SECTION_RE = re.compile(
+    r'(?=.*?(?P<PL>profit\s*&\s*loss|income\s*statement|p&l|revenue|income|expenses))'
+    r'|(?=.*?(?P<BS>balance\s*sheet|assets|liabilities|equity))'
+    r'|(?=.*?(?P<CF>cash\s*flow|cash\s*and\s*cash\s*equivalents|operating\s*activities))'
+    r'|(?=.*?(?P<Notes>notes|disclosures|accounting\s*policies))',
+    re.IGNORECASE
+)
+_GROUP_TO_NAME = {'PL': 'P&L', 'BS': 'BS', 'CF': 'Cash Flow', 'Notes': 'Notes'}
+
+# A financial line: it contains a digit or comma somewhere, and its key and value
+# are the text before its first ':' or '|' and between that and the next one.
+# Runs of whitespace inside the two groups are collapsed after matching
+_LINE_RE = re.compile(r'(?=.*[0-9,])\s*([^:|]*?)\s*[:|]\s*([^:|]*)')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Neither PyMuPDF nor PyPDF2 extracts pages in parallel within one process
+# (PyMuPDF is not thread-safe and PyPDF2 holds the GIL), so large PDFs are
+# split across a shared pool of worker processes, started on first use.
+# Workers are spawned rather than forked because the server process runs threads
+_PDF_WORKERS = Config.PDF_EXTRACT_WORKERS or os.cpu_count() or 1
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+def _get_pdf_pool():
+    """Return the shared PDF extraction process pool, starting it on first use"""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(max_workers=_PDF_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _pdf_pool
+
+def _extract_pdf_page_range(file_path, start, stop):
+    """
+    Extract the text of pages start to stop - 1; runs in a worker process
+    
+    Args:
+        file_path (str): Path to the PDF file
+        start (int): Index of the first page
+        stop (int): Index one past the last page
+    
+    Returns:
+        list: Text of each page in the range, in order
+    """
+    if pymupdf is not None:
+        with pymupdf.open(file_path) as doc:
+            return [doc[page_num].get_text("text") for page_num in range(start, stop)]
+    
+    with open(file_path, 'rb') as file:
+        pages = PyPDF2.PdfReader(file).pages
+        return [pages[page_num].extract_text() for page_num in range(start, stop)]
+
+def _json_indented(obj):
+    """Serialize to JSON indented by two spaces, as json.dumps(obj, indent=2) does but in C"""
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+
 class FileProcessor:
     """Process various file types (Excel, PDF) and generate formatted output using OpenAI"""
     
     def __init__(self):
         self.openai_client = OpenAPIClient()
         self.template_path = "document/Template-Waaree.xlsx"
+        self._template = TemplateWorkbook()
         
     def detect_file_type(self, file_path):
         """
@@ -50,31 +118,7 @@ class FileProcessor:
             dict: Extracted data from the file
         """
         try:
-            # Read all sheets
-            excel_file = pd.ExcelFile(file_path)
-            data = {}
-            
-            for sheet_name in excel_file.sheet_names:
-                df = pd.read_excel(file_path, sheet_name=sheet_name)
-                # Convert DataFrame to records and handle NaN values
-                records = df.to_dict('records')
-                # Clean the data by replacing NaN with None and handling time objects
-                cleaned_records = []
-                for record in records:
-                    cleaned_record = {}
-                    for key, value in record.items():
-                        if pd.isna(value):
-                            cleaned_record[key] = None
-                        elif hasattr(value, 'time') or hasattr(value, 'strftime'):
-                            # Convert time/datetime objects to strings
-                            if hasattr(value, 'strftime'):
-                                cleaned_record[key] = value.strftime('%H:%M:%S')
-                            else:
-                                cleaned_record[key] = str(value)
-                        else:
-                            cleaned_record[key] = value
-                    cleaned_records.append(cleaned_record)
-                data[sheet_name] = cleaned_records
+            data = read_workbook_records(file_path)
             
             logger.info(f"Successfully read Excel file: {file_path}")
             return data
@@ -96,21 +140,18 @@ class FileProcessor:
         try:
             data = {}
             
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                # Extract text from all pages
-                all_text = ""
-                for page_num, page in enumerate(pdf_reader.pages):
-                    page_text = page.extract_text()
-                    all_text += f"\n--- Page {page_num + 1} ---\n{page_text}"
+            # Extract text from all pages
+            all_text = "".join(
+                f"\n--- Page {page_num + 1} ---\n{page_text}"
+                for page_num, page_text in enumerate(self._extract_pdf_pages(file_path))
+            )
                 
-                # Try to identify financial sections
-                sections = self._parse_financial_sections(all_text)
+            # Try to identify financial sections
+            sections = self._parse_financial_sections(all_text)
                 
-                # Create a structured format similar to Excel sheets
-                for section_name, section_data in sections.items():
-                    data[section_name] = section_data
+            # Create a structured format similar to Excel sheets
+            for section_name, section_data in sections.items():
+                data[section_name] = section_data
             
             logger.info(f"Successfully read PDF file: {file_path}")
             return data
@@ -119,6 +160,42 @@ class FileProcessor:
             logger.error(f"Error reading PDF file: {str(e)}")
             raise
     
+    def _extract_pdf_pages(self, file_path):
+        """
+        Extract the text of each page, with PyMuPDF when it is installed
+        
+        Large PDFs are split into page ranges extracted by the shared process pool.
+        
+        Args:
+            file_path (str): Path to the PDF file
+            
+        Returns:
+            list: Text of each page, in order
+        """
+        if pymupdf is not None:
+            with pymupdf.open(file_path) as doc:
+                page_count = doc.page_count
+                if _PDF_WORKERS == 1 or page_count < Config.PDF_PARALLEL_MIN_PAGES:
+                    return [page.get_text("text") for page in doc]
+        else:
+            with open(file_path, 'rb') as file:
+                pages = PyPDF2.PdfReader(file).pages
+                page_count = len(pages)
+                if _PDF_WORKERS == 1 or page_count < Config.PDF_PARALLEL_MIN_PAGES:
+                    return [page.extract_text() for page in pages]
+        
+        # Hand each worker one contiguous range of pages, so every process
+        # opens the document once
+        chunk = -(-page_count // _PDF_WORKERS)
+        starts = range(0, page_count, chunk)
+        stops = [min(start + chunk, page_count) for start in starts]
+        logger.info(f"Extracting {page_count} PDF pages in {len(starts)} worker processes")
+        
+        page_texts = []
+        for texts in _get_pdf_pool().map(_extract_pdf_page_range, repeat(file_path), starts, stops):
+            page_texts.extend(texts)
+        return page_texts
+    
     def _parse_financial_sections(self, text):
         """
         Parse financial sections from PDF text
@@ -131,14 +208,6 @@ class FileProcessor:
         """
         sections = {}
         
-        # Common financial section patterns
-        patterns = {
-            'P&L': r'(?:profit\s*&\s*loss|income\s*statement|p&l|revenue|income|expenses)',
-            'BS': r'(?:balance\s*sheet|assets|liabilities|equity)',
-            'Cash Flow': r'(?:cash\s*flow|cash\s*and\s*cash\s*equivalents|operating\s*activities)',
-            'Notes': r'(?:notes|disclosures|accounting\s*policies)'
-        }
-        
         # Split text into sections based on patterns
         lines = text.split('\n')
         current_section = 'General'
@@ -150,17 +219,13 @@ class FileProcessor:
                 continue
                 
             # Check if line contains section headers
-            section_found = False
-            for section_name, pattern in patterns.items():
-                if re.search(pattern, line, re.IGNORECASE):
-                    if current_data:
-                        sections[current_section] = current_data
-                    current_section = section_name
-                    current_data = []
-                    section_found = True
-                    break
-            
-            if not section_found:
+            match = _SECTION_RE.match(line)
+            if match:
+                if current_data:
+                    sections[current_section] = current_data
+                current_section = _GROUP_TO_NAME[match.lastgroup]
+                current_data = []
+            else:
                 # Try to parse line as financial data
                 parsed_line = self._parse_financial_line(line)
                 if parsed_line:
@@ -182,18 +247,13 @@ class FileProcessor:
         Returns:
             dict: Parsed financial data or None
         """
-        # Remove extra whitespace
-        line = re.sub(r'\s+', ' ', line.strip())
-        
         # Look for patterns like "Item Name: 1,000" or "Item Name 1,000"
         # This is a simplified parser - can be enhanced based on actual PDF formats
-        if re.search(r'[0-9,]+\.?[0-9]*', line):
-            # Try to split on common delimiters
-            parts = re.split(r'[:|]\s*', line)
-            if len(parts) >= 2:
-                key = parts[0].strip()
-                value = parts[1].strip()
-                return {key: value}
+        match = _LINE_RE.match(line)
+        if match:
+            key = _WHITESPACE_RE.sub(' ', match.group(1))
+            value = _WHITESPACE_RE.sub(' ', match.group(2)).strip()
+            return {key: value}
         
         return None
     
@@ -224,34 +284,8 @@ class FileProcessor:
             dict: Template structure information
         """
         try:
-            template_data = self.read_excel_file(self.template_path)
-            
-            # Analyze structure
-            structure = {
-                "sheets": {},
-                "headers": {},
-                "data_types": {},
-                "template_rows": {}
-            }
-            
-            for sheet_name, data in template_data.items():
-                if data:
-                    structure["sheets"][sheet_name] = {
-                        "columns": list(data[0].keys()),
-                        "row_count": len(data)
-                    }
-                    
-                    # Include actual template rows so OpenAI knows which rows to map to
-                    structure["template_rows"][sheet_name] = data
-                    
-                    # Analyze data types and convert to JSON-serializable format
-                    df = pd.DataFrame(data)
-                    dtypes_dict = {}
-                    for col, dtype in df.dtypes.items():
-                        # Convert pandas dtype to string representation
-                        dtypes_dict[str(col)] = str(dtype)
-                    structure["data_types"][sheet_name] = dtypes_dict
-            
+            stat = os.stat(self.template_path)
+            structure = analyze_template_cached(self.template_path, stat.st_mtime, stat.st_size)
             logger.info("Template analysis completed")
             return structure
             
@@ -297,6 +331,9 @@ class FileProcessor:
                 # Limit to maximum 10 rows to keep prompt manageable
                 simplified_template["template_rows"][sheet_name] = key_rows[:10]
         
+        # Both parts are serialized in one pass, under the names the instructions use
+        payload = {"template_structure": simplified_template, "uploaded_data": filtered_data}
+        
         file_type_instructions = ""
         if file_type == 'pdf':
             file_type_instructions = """
@@ -313,11 +350,9 @@ You are an expert financial data processor. I need you to process uploaded data
 
 {file_type_instructions}
 
-TEMPLATE STRUCTURE (SIMPLIFIED):
-{json.dumps(simplified_template, indent=2)}
-
-UPLOADED DATA (FILTERED FOR RELEVANT SHEETS):
-{json.dumps(filtered_data, indent=2)}
+TEMPLATE STRUCTURE AND UPLOADED DATA:
+"template_structure" holds the simplified template and "uploaded_data" the uploaded data, filtered for relevant sheets.
+{_json_indented(payload)}
 
 INSTRUCTIONS:
 1. Use the template structure shown above as your reference for the output format.
@@ -437,7 +472,8 @@ Return only the JSON data, no additional text or explanations.
             # Extract the response content
             content = response['choices'][0]['message']['content']
             logger.info(f"OpenAI response received (length: {len(content)} characters)")
-            logger.info(f"OpenAI response preview: {content[:200]}...")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("OpenAI response preview: %s...", content[:200])
             
             # Check if response was truncated
             if response['choices'][0].get('finish_reason') == 'length':
@@ -446,25 +482,12 @@ Return only the JSON data, no additional text or explanations.
             
             # Try to parse JSON from the response
             try:
-                # Clean the response to extract JSON
-                content = content.strip()
-                
-                # Remove markdown code blocks
-                if content.startswith('```json'):
-                    content = content[7:]
-                elif content.startswith('```'):
-                    content = content[3:]
-                if content.endswith('```'):
-                    content = content[:-3]
-                
-                # Remove any leading/trailing whitespace
-                content = content.strip()
-                
-                # Try to find JSON object boundaries if there's extra text
+                # Slice out the outermost JSON object; this also drops markdown
+                # code fences and any text around the object in one pass
                 start_idx = content.find('{')
                 end_idx = content.rfind('}')
                 
-                if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
+                if start_idx != -1 and end_idx > start_idx:
                     content = content[start_idx:end_idx + 1]
                 
                 # Check if JSON appears to be complete
@@ -474,19 +497,20 @@ Return only the JSON data, no additional text or explanations.
                     raise ValueError("Incomplete JSON response - likely truncated")
                 
                 logger.info(f"Cleaned response (length: {len(content)} characters)")
-                logger.info(f"Cleaned response preview: {content[:200]}...")
-                logger.info(f"Cleaned response end: ...{content[-200:]}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Cleaned response preview: %s...", content[:200])
+                    logger.debug("Cleaned response end: ...%s", content[-200:])
                 
                 # Try to parse the JSON
-                processed_data = json.loads(content)
+                processed_data = orjson.loads(content)
                 logger.info(f"Successfully parsed JSON. Keys: {list(processed_data.keys())}")
                 
                 # Validate the processed data structure
                 for sheet_name, data in processed_data.items():
                     if isinstance(data, list):
-                        logger.info(f"Sheet '{sheet_name}' has {len(data)} rows")
-                        if data:
-                            logger.info(f"First row keys: {list(data[0].keys()) if data[0] else 'No keys'}")
+                        logger.debug("Sheet '%s' has %d rows", sheet_name, len(data))
+                        if data and logger.isEnabledFor(logging.DEBUG):
+                            logger.debug("First row keys: %s", list(data[0].keys()) if data[0] else 'No keys')
                     else:
                         logger.warning(f"Sheet '{sheet_name}' is not a list: {type(data)}")
                 
@@ -496,7 +520,7 @@ Return only the JSON data, no additional text or explanations.
                     for sheet_name, processed_rows in processed_data['sheets'].items():
                         if sheet_name in template_structure.get('template_rows', {}):
                             template_rows = template_structure['template_rows'][sheet_name]
-                            logger.info(f"Validating sheet '{sheet_name}': processed={len(processed_rows)} rows, template={len(template_rows)} rows")
+                            logger.debug("Validating sheet '%s': processed=%d rows, template=%d rows", sheet_name, len(processed_rows), len(template_rows))
                             
                             if len(processed_rows) != len(template_rows):
                                 logger.warning(f"Row count mismatch in sheet '{sheet_name}': processed has {len(processed_rows)} rows, template has {len(template_rows)} rows")
@@ -515,7 +539,7 @@ Return only the JSON data, no additional text or explanations.
                 logger.info("Successfully processed data with OpenAI")
                 return processed_data
                 
-            except json.JSONDecodeError as e:
+            except orjson.JSONDecodeError as e:
                 logger.error(f"Failed to parse OpenAI response as JSON: {str(e)}")
                 logger.error(f"Error position: {e.pos}")
                 logger.error(f"Error line: {e.lineno}, column: {e.colno}")
@@ -530,19 +554,12 @@ Return only the JSON data, no additional text or explanations.
                 # Try to fix common JSON issues
                 logger.info("Attempting to fix common JSON issues...")
                 try:
-                    # Try to fix trailing commas
-                    import re
-                    fixed_content = re.sub(r',(\s*[}\]])', r'\1', content)
-                    
-                    # Try to fix unquoted keys
-                    fixed_content = re.sub(r'(\s*)(\w+)(\s*):', r'\1"\2"\3:', fixed_content)
-                    
                     logger.info("Attempting to parse fixed JSON...")
-                    processed_data = json.loads(fixed_content)
+                    processed_data = load_repaired_json(content)
                     logger.info("Successfully parsed JSON after fixing common issues")
                     return processed_data
                     
-                except json.JSONDecodeError as e2:
+                except ValueError as e2:
                     logger.error(f"Failed to parse even after fixing common issues: {str(e2)}")
                     raise ValueError("OpenAI response is not valid JSON and could not be fixed")
                 
@@ -562,16 +579,9 @@ Return only the JSON data, no additional text or explanations.
             str: Path to the created file
         """
         try:
-            # Load template
-            template_wb = openpyxl.load_workbook(self.template_path)
-            logger.info(f"Template loaded with sheets: {template_wb.sheetnames}")
-            
-            # Create new workbook
-            output_wb = Workbook()
-            
-            # Get the default sheet name
-            default_sheet_name = output_wb.sheetnames[0]
-            logger.info(f"Default sheet name: {default_sheet_name}")
+            # Create new workbook; rows are streamed to disk as they are appended
+            output_wb = Workbook(write_only=True)
+            style_cache = {}
             
             # Check if processed_data has the expected structure
             if 'sheets' not in processed_data:
@@ -582,106 +592,55 @@ Return only the JSON data, no additional text or explanations.
             sheet_data = processed_data['sheets']
             logger.info(f"Sheet data keys: {list(sheet_data.keys())}")
             
-            # Copy template structure and apply data
-            for sheet_name in template_wb.sheetnames:
-                logger.info(f"Processing sheet: {sheet_name}")
-                
-                if sheet_name in sheet_data:
-                    logger.info(f"Found processed data for sheet: {sheet_name}")
-                    sheet_rows = sheet_data[sheet_name]
-                    logger.info(f"Sheet '{sheet_name}' has {len(sheet_rows)} rows")
+            # The template is held open for reading until every sheet is copied
+            with self._template.use(self.template_path) as template_wb:
+                # Copy template structure and apply data
+                for sheet_name in template_wb.sheetnames:
+                    logger.debug("Processing sheet: %s", sheet_name)
                     
-                    # Create new sheet or use existing
-                    if sheet_name in output_wb.sheetnames:
-                        output_ws = output_wb[sheet_name]
-                        logger.info(f"Using existing sheet: {sheet_name}")
-                    else:
-                        # If this is the first sheet, rename the default sheet
-                        if len(output_wb.sheetnames) == 1 and output_wb.sheetnames[0] == default_sheet_name:
-                            output_wb.active.title = sheet_name
-                            output_ws = output_wb.active
-                            logger.info(f"Renamed default sheet to: {sheet_name}")
-                        else:
-                            output_ws = output_wb.create_sheet(sheet_name)
-                            logger.info(f"Created new sheet: {sheet_name}")
-                    
-                    # Copy template sheet
-                    template_ws = template_wb[sheet_name]
-                    logger.info(f"Template sheet dimensions: {template_ws.max_row} rows x {template_ws.max_column} columns")
-                    
-                    # Copy formatting and structure from template
-                    for row in template_ws.iter_rows():
-                        for cell in row:
-                            new_cell = output_ws.cell(row=cell.row, column=cell.column)
-                            new_cell.value = cell.value
-                            
-                            # Copy formatting
-                            if cell.font:
-                                new_cell.font = Font(
-                                    name=cell.font.name,
-                                    size=cell.font.size,
-                                    bold=cell.font.bold,
-                                    italic=cell.font.italic,
-                                    color=cell.font.color
-                                )
-                            
-                            if cell.alignment:
-                                new_cell.alignment = Alignment(
-                                    horizontal=cell.alignment.horizontal,
-                                    vertical=cell.alignment.vertical,
-                                    wrap_text=cell.alignment.wrap_text
-                                )
-                            
-                            if cell.fill:
-                                new_cell.fill = PatternFill(
-                                    fill_type=cell.fill.fill_type,
-                                    start_color=cell.fill.start_color,
-                                    end_color=cell.fill.end_color
-                                )
-                    
-                    # Apply processed data
-                    if sheet_rows and len(sheet_rows) > 0:
-                        logger.info(f"Applying {len(sheet_rows)} rows of data to sheet: {sheet_name}")
+                    if sheet_name in sheet_data:
+                        logger.debug("Found processed data for sheet: %s", sheet_name)
+                        sheet_rows = sheet_data[sheet_name]
+                        logger.debug("Sheet '%s' has %d rows", sheet_name, len(sheet_rows))
                         
-                        # Get the column headers from the first row of processed data
-                        if isinstance(sheet_rows[0], dict):
-                            headers = list(sheet_rows[0].keys())
-                            logger.info(f"Data headers: {headers}")
-                            
-                            # Write headers to first row
-                            for col_idx, header in enumerate(headers, 1):
-                                cell = output_ws.cell(row=1, column=col_idx)
-                                cell.value = header
-                                logger.info(f"Writing header '{header}' to cell {1}:{col_idx}")
+                        output_ws = output_wb.create_sheet(sheet_name)
+                        logger.debug("Created new sheet: %s", sheet_name)
+                        
+                        template_ws = template_wb[sheet_name]
+                        logger.debug("Template sheet dimensions: %s rows x %s columns", template_ws.max_row, template_ws.max_column)
+                        
+                        # Values written over the template: headers in the first row, data from row 2
+                        data_rows = []
+                        if sheet_rows and len(sheet_rows) > 0:
+                            logger.debug("Applying %d rows of data to sheet: %s", len(sheet_rows), sheet_name)
                             
-                            # Write data starting from row 2
-                            for row_idx, row_data in enumerate(sheet_rows, 2):
-                                logger.info(f"Writing row {row_idx}: {row_data}")
-                                for col_idx, (col_name, value) in enumerate(row_data.items(), 1):
-                                    cell = output_ws.cell(row=row_idx, column=col_idx)
+                            # Get the column headers from the first row of processed data
+                            if isinstance(sheet_rows[0], dict):
+                                headers = list(sheet_rows[0].keys())
+                                logger.debug("Data headers: %s", headers)
+                                
+                                data_rows.append(headers)
+                                row_values = row_extractor(headers)
+                                for row_data in sheet_rows:
                                     # Handle None values
-                                    if value is None:
-                                        cell.value = ""
-                                    else:
-                                        cell.value = value
-                                    logger.info(f"Writing '{value}' to cell {row_idx}:{col_idx}")
+                                    data_rows.append(["" if value is None else value for value in row_values(row_data)])
+                            else:
+                                logger.warning(f"Sheet data is not in expected format. First row type: {type(sheet_rows[0])}")
                         else:
-                            logger.warning(f"Sheet data is not in expected format. First row type: {type(sheet_rows[0])}")
+                            logger.warning(f"No processed data found for sheet: {sheet_name}")
+                        
+                        # Write-only sheets are filled row by row, so each template row is
+                        # merged with the data written over it before it is appended
+                        for template_row, values in zip_longest(template_ws.iter_rows(), data_rows, fillvalue=()):
+                            output_ws.append(merge_row(output_ws, template_row, values, style_cache))
                     else:
-                        logger.warning(f"No processed data found for sheet: {sheet_name}")
-                else:
-                    logger.warning(f"No processed data found for template sheet: {sheet_name}")
-            
-            # Remove the default sheet only if we have other sheets
-            if len(output_wb.sheetnames) > 1 and default_sheet_name in output_wb.sheetnames:
-                output_wb.remove(output_wb[default_sheet_name])
-                logger.info(f"Removed default sheet: {default_sheet_name}")
+                        logger.warning(f"No processed data found for template sheet: {sheet_name}")
             
             # Ensure we have at least one sheet
             if len(output_wb.sheetnames) == 0:
                 # Create a default sheet if no sheets exist
-                output_wb.create_sheet("Sheet1")
-                logger.warning("No sheets were created, added default Sheet1")
+                output_wb.create_sheet("Sheet")
+                logger.warning("No sheets were created, added default Sheet")
             
             logger.info(f"Final workbook sheets: {output_wb.sheetnames}")
             
@@ -691,11 +650,8 @@ Return only the JSON data, no additional text or explanations.
             
             return output_path
             
-        except Exception as e:
-            logger.error(f"Error creating formatted Excel: {str(e)}")
-            logger.error(f"Exception type: {type(e)}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+        except Exception:
+            logger.exception("Error creating formatted Excel")
             raise
     
     def process_uploaded_file(self, uploaded_file_path):
@@ -719,13 +675,14 @@ Return only the JSON data, no additional text or explanations.
             uploaded_data = self.read_file(uploaded_file_path)
             logger.info(f"Uploaded data sheets: {list(uploaded_data.keys())}")
             for sheet_name, data in uploaded_data.items():
-                logger.info(f"Sheet '{sheet_name}' has {len(data)} rows")
+                logger.debug("Sheet '%s' has %d rows", sheet_name, len(data))
                 if data:
-                    logger.info(f"Sample data from '{sheet_name}': {data[0] if data else 'No data'}")
+                    logger.debug("Sample data from '%s': %s", sheet_name, data[0])
             
             # Analyze template
             template_structure = self.analyze_template()
-            logger.info(f"Template structure: {json.dumps(template_structure, indent=2)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Template structure: %s", _json_indented(template_structure))
             
             # Process with OpenAI
             logger.info("Starting OpenAI processing...")
@@ -737,11 +694,11 @@ Return only the JSON data, no additional text or explanations.
                 sheet_data = processed_data['sheets']
                 for sheet_name, data in sheet_data.items():
                     if isinstance(data, list):
-                        logger.info(f"Processed sheet '{sheet_name}' has {len(data)} rows")
+                        logger.debug("Processed sheet '%s' has %d rows", sheet_name, len(data))
                         if data:
-                            logger.info(f"Processed data sample from '{sheet_name}': {data[0] if data else 'No data'}")
+                            logger.debug("Processed data sample from '%s': %s", sheet_name, data[0])
                     else:
-                        logger.info(f"Processed sheet '{sheet_name}' has structure: {type(data)}")
+                        logger.debug("Processed sheet '%s' has structure: %s", sheet_name, type(data))
             else:
                 logger.warning("No 'sheets' key found in processed data")
             
@@ -757,9 +714,6 @@ Return only the JSON data, no additional text or explanations.
             logger.info(f"File processing completed: {output_path}")
             return output_path
             
-        except Exception as e:
-            logger.error(f"Error processing uploaded file: {str(e)}")
-            logger.error(f"Exception type: {type(e)}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+        except Exception:
+            logger.exception("Error processing uploaded file")
             raise 
\ No newline at end of file
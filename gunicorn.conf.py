@@ -0,0 +1,19 @@
+import os
+
+# Production server configuration, used with: gunicorn -c gunicorn.conf.py app:app
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5001')
+
+# Threaded workers: each request thread hands its LLM calls to the shared
+# asyncio loop in api_client, so a worker holds many upstream calls in flight
+# while its threads only wait on futures. Upload jobs, the LLM response cache
+# and in-flight request dedup live in process memory, so the default is a
+# single worker; raise GUNICORN_WORKERS only behind sticky routing
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS', '1'))
+threads = int(os.getenv('GUNICORN_THREADS', '64'))
+
+# Above LLM_READ_TIMEOUT plus retries, so slow upstream calls are not killed mid-request
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '180'))
+graceful_timeout = 30
+keepalive = 5
@@ -0,0 +1,22 @@
+import dirtyjson
+
+# Repairs for common defects in model-generated JSON, shared by the processors
+
+def load_repaired_json(content):
+    """
+    Parse JSON that failed strict parsing with a lenient parser
+    
+    dirtyjson accepts trailing commas, bare keys and single-quoted strings
+    while tokenizing, so string contents such as "ratio: high" are never
+    rewritten the way a regex fix-up would.
+    
+    Args:
+        content (str): JSON text from the model
+        
+    Returns:
+        dict: Parsed data
+        
+    Raises:
+        ValueError: If the text cannot be parsed even leniently
+    """
+    return dirtyjson.loads(content)
\ No newline at end of file
@@ -0,0 +1,63 @@
+from typing import Annotated, Union
+import msgspec
+
+# Request bodies for the chat endpoints, decoded and validated in one pass so
+# malformed input is rejected locally instead of after an upstream round trip
+
+class ChatMessage(msgspec.Struct):
+    """Known fields of a conversation turn, type-checked; the message itself is forwarded as sent"""
+    role: str
+    content: Union[str, list[dict], None, msgspec.UnsetType] = msgspec.UNSET
+    name: Union[str, msgspec.UnsetType] = msgspec.UNSET
+    tool_calls: Union[list[dict], msgspec.UnsetType] = msgspec.UNSET
+    tool_call_id: Union[str, msgspec.UnsetType] = msgspec.UNSET
+
+# Messages stay plain dicts so fields not declared on ChatMessage (function_call,
+# refusal, ...) reach the upstream API instead of being dropped
+Messages = Annotated[list[dict], msgspec.Meta(min_length=1)]
+
+def _validate_messages(messages):
+    """Raise ValueError, reported by msgspec as a ValidationError, if a message's known fields are missing or mistyped"""
+    for i, message in enumerate(messages):
+        try:
+            msgspec.convert(message, ChatMessage)
+        except msgspec.ValidationError as e:
+            raise ValueError(f"{e} in message {i}") from None
+
+Temperature = Annotated[float, msgspec.Meta(ge=0, le=2)]
+MaxTokens = Annotated[int, msgspec.Meta(gt=0)]
+
+# Every conversation in a batch becomes an upstream call, so one request is capped
+MAX_BATCH_SIZE = 100
+
+class ChatRequest(msgspec.Struct):
+    """Body of /api/openai/chat and /api/openai/chat/stream"""
+    messages: Messages
+    temperature: Temperature = 0.7
+    max_tokens: MaxTokens = 1000
+    
+    def __post_init__(self):
+        _validate_messages(self.messages)
+
+class BatchChatRequest(msgspec.Struct):
+    """Body of /api/openai/chat/batch"""
+    messages_list: Annotated[list[Messages], msgspec.Meta(min_length=1, max_length=MAX_BATCH_SIZE)]
+    temperature: Temperature = 0.7
+    max_tokens: MaxTokens = 1000
+    
+    def __post_init__(self):
+        for messages in self.messages_list:
+            _validate_messages(messages)
+
+class AnthropicChatRequest(msgspec.Struct):
+    """Body of /api/anthropic/chat"""
+    messages: Messages
+    model: str = 'claude-3-sonnet-20240229'
+    max_tokens: MaxTokens = 1000
+    
+    def __post_init__(self):
+        _validate_messages(self.messages)
+
+chat_request_decoder = msgspec.json.Decoder(ChatRequest)
+batch_chat_request_decoder = msgspec.json.Decoder(BatchChatRequest)
+anthropic_chat_request_decoder = msgspec.json.Decoder(AnthropicChatRequest)
\ No newline at end of file
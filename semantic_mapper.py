@@ -1,16 +1,159 @@
 import pandas as pd
+import numpy as np
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+import hashlib
 import logging
+import os
+import platform
+import tempfile
+import threading
+from collections import OrderedDict
+from config import Config
+from excel_reader import read_workbook_records
 
 logger = logging.getLogger(__name__)
-model = SentenceTransformer('all-MiniLM-L6-v2')
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+
+def _cpu_onnx_file():
+    # The model repository ships int8 exports tuned for these instruction sets;
+    # AVX2 is the baseline for any x86-64 CPU that can run them
+    if platform.machine().lower() in ('arm64', 'aarch64'):
+        return 'onnx/model_qint8_arm64.onnx'
+    try:
+        with open('/proc/cpuinfo') as f:
+            flags = next((line.split(':', 1)[1].split() for line in f if line.startswith('flags')), [])
+    except OSError:
+        flags = []
+    if 'avx512_vnni' in flags:
+        return 'onnx/model_qint8_avx512_vnni.onnx'
+    if 'avx512f' in flags:
+        return 'onnx/model_qint8_avx512.onnx'
+    return 'onnx/model_quint8_avx2.onnx'
+
+# Threads for one encode call. Beyond about 8 the small model stops scaling,
+# and inter-op parallelism is off since encode runs one graph at a time
+_EMBEDDING_THREADS = Config.EMBEDDING_THREADS or min(8, os.cpu_count() or 4)
+
+def _embedding_device():
+    # The configured device, else CUDA when PyTorch can see a GPU
+    if Config.EMBEDDING_DEVICE:
+        return Config.EMBEDDING_DEVICE
+    try:
+        import torch
+        return 'cuda' if torch.cuda.is_available() else 'cpu'
+    except ImportError:
+        return 'cpu'
+
+def _load_model():
+    # Returns the model and an id of the weights actually loaded, used to key cached embeddings
+    device = _embedding_device()
+    if Config.EMBEDDING_BACKEND == 'onnx' and device == 'cpu':
+        onnx_file = Config.EMBEDDING_ONNX_FILE or _cpu_onnx_file()
+        try:
+            import onnxruntime
+            session_options = onnxruntime.SessionOptions()
+            session_options.intra_op_num_threads = _EMBEDDING_THREADS
+            session_options.inter_op_num_threads = 1
+            onnx_model = SentenceTransformer(
+                MODEL_NAME, backend='onnx',
+                model_kwargs={"file_name": onnx_file, "session_options": session_options}
+            )
+            return onnx_model, f"{MODEL_NAME}:onnx:{onnx_file}"
+        except Exception as e:
+            logger.warning(f"Could not load ONNX model {onnx_file} ({str(e)}), using PyTorch")
+
+    import torch
+    torch.set_num_threads(_EMBEDDING_THREADS)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Can only be set before torch starts any parallel work
+        pass
+    logger.info(f"Loading embedding model {MODEL_NAME} with PyTorch on {device}")
+    return SentenceTransformer(MODEL_NAME, device=device), f"{MODEL_NAME}:torch"
+
+model, _model_id = _load_model()
+
+def _encode(texts):
+    # Unit-length embeddings make cosine similarity a plain dot product; no
+    # progress bar, since this runs inside request handling
+    return model.encode(texts, batch_size=64, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False)
+
+# Cached embeddings are stored as float16, halving their memory and disk
+# size; scoring casts them back to float32, since NumPy has no fast float16
+# matrix product. Values used for scoring are always the rounded ones, so a
+# label scores the same whether or not it was cached
+_STORED_DTYPE = np.float16
+
+# Embeddings of recently seen uploaded labels, least recently used first
+_label_embeddings = OrderedDict()
+_label_embeddings_lock = threading.Lock()
+
+def _encode_cached(texts):
+    # Uploads repeat most of their labels from one request to the next, so
+    # only labels missing from the in-memory cache reach the model
+    if not texts:
+        return _encode(texts)
+
+    found = {}
+    with _label_embeddings_lock:
+        for text in texts:
+            embedding = _label_embeddings.get(text)
+            if embedding is not None:
+                _label_embeddings.move_to_end(text)
+                found[text] = embedding
+
+    missing = [text for text in texts if text not in found]
+    if missing:
+        embeddings = _encode(missing).astype(_STORED_DTYPE)
+        with _label_embeddings_lock:
+            for text, embedding in zip(missing, embeddings):
+                found[text] = embedding
+                _label_embeddings[text] = embedding
+            while len(_label_embeddings) > Config.EMBEDDING_MEMORY_CACHE_SIZE:
+                _label_embeddings.popitem(last=False)
+    return np.stack([found[text] for text in texts]).astype(np.float32)
+
+def _get_template_embeddings(template_rows, cache_dir=Config.EMBEDDING_CACHE_DIR):
+    # Template rows rarely change, so their embeddings are stored on disk keyed by
+    # the rows and the model that produced them
+    key = hashlib.blake2b(f"{_model_id}:{np.dtype(_STORED_DTYPE).name}".encode(), digest_size=16)
+    for row in template_rows:
+        key.update(b"\0" + row.encode())
+    cache_path = os.path.join(cache_dir, f"{key.hexdigest()}.npy")
+
+    try:
+        return np.load(cache_path).astype(np.float32)
+    except (OSError, ValueError):
+        pass
+
+    # Templates repeat labels such as "Total"; each distinct one is encoded once
+    unique_rows = list(dict.fromkeys(template_rows))
+    unique_emb = _encode(unique_rows).astype(_STORED_DTYPE)
+    positions = {row: i for i, row in enumerate(unique_rows)}
+    embeddings = unique_emb[[positions[row] for row in template_rows]]
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write then rename, so concurrent workers never read a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, embeddings)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"Could not cache template embeddings in {cache_dir}: {str(e)}")
+    return embeddings.astype(np.float32)
 
 def load_excel(file_path):
-    xl = pd.ExcelFile(file_path)
+    # Sheets are streamed in read-only mode; only the small frames are built in pandas
+    return frames_from_records(read_workbook_records(file_path))
+
+def frames_from_records(sheets):
+    # DataFrame per sheet from read_workbook_records output, so callers that
+    # already read the workbook do not parse it again
     data = {}
-    for sheet in xl.sheet_names:
-        df = xl.parse(sheet)
+    for sheet, records in sheets.items():
+        df = pd.DataFrame.from_records(records)
         df.columns = [str(col).strip() for col in df.columns]
         data[sheet] = df
     return data
@@ -26,15 +169,65 @@ def extract_template_structure(template_data):
         }
     return structure
 
-def match_rows(template_rows, input_rows):
-    template_emb = model.encode(template_rows)
-    input_emb = model.encode(input_rows)
+def _exact_matches(template_rows, unique_rows):
+    # The input row each template row matches exactly, ignoring case and
+    # surrounding whitespace (first such row), or None. The uncased tokenizer
+    # gives both the same embedding, so that row scores highest anyway
+    input_index = {}
+    for row in unique_rows:
+        input_index.setdefault(row.strip().lower(), row)
+    return {t_row: input_index.get(t_row.strip().lower()) for t_row in template_rows}
+
+def match_rows(template_rows, input_rows, k=1):
+    # Maps each template row to its best input row, or with k > 1 to a list of
+    # the k best input rows, most similar first
+    # Repeated labels (section headers, "Total" lines) are encoded once; keeping
+    # first occurrences in order leaves argmax ties resolving to the same label
+    unique_rows = list(dict.fromkeys(input_rows))
+    if not template_rows or not unique_rows:
+        # Nothing to score; every template row is left without a match
+        return {t_row: None if k == 1 else [] for t_row in template_rows}
+    exact = _exact_matches(template_rows, unique_rows)
+
+    if k == 1:
+        # Exact matches skip scoring; when every row has one nothing is encoded
+        residual_idx = [i for i, t_row in enumerate(template_rows) if exact[t_row] is None]
+        if not residual_idx:
+            return exact
+        # Embeddings of the full row list are looked up, so the disk cache key
+        # does not depend on which rows matched exactly
+        template_emb = _get_template_embeddings(template_rows)[residual_idx]
+        input_emb = _encode_cached(unique_rows)
+
+        # One matrix product scores every remaining template row against every input row
+        best_match_idx = (template_emb @ input_emb.T).argmax(axis=1)
+        for i, idx in zip(residual_idx, best_match_idx.tolist()):
+            exact[template_rows[i]] = unique_rows[idx]
+        return exact
+
+    template_emb = _get_template_embeddings(template_rows)
+    input_emb = _encode_cached(unique_rows)
+    scores = template_emb @ input_emb.T
+
+    # Partition out each row's k-th best score, keep everything above it plus
+    # the earliest rows tied with it, then sort only those k candidates. Ties
+    # keep input order, and an exact match is moved to the front, so the first
+    # candidate is always the k == 1 match
+    k = min(k, len(unique_rows))
+    kth_scores = np.partition(scores, -k, axis=1)[:, [-k]]
+    above = scores > kth_scores
+    tied = scores == kth_scores
+    selected = above | (tied & (np.cumsum(tied, axis=1) <= k - above.sum(axis=1, keepdims=True)))
+    top_idx = np.nonzero(selected)[1].reshape(len(template_rows), k)
+    order = np.argsort(-np.take_along_axis(scores, top_idx, axis=1), axis=1, kind="stable")
+    top_idx = np.take_along_axis(top_idx, order, axis=1)
 
     mapping = {}
-    for i, t_row in enumerate(template_rows):
-        sims = cosine_similarity([template_emb[i]], input_emb)[0]
-        best_match_idx = sims.argmax()
-        mapping[t_row] = input_rows[best_match_idx]
+    for t_row, row in zip(template_rows, top_idx.tolist()):
+        candidates = [unique_rows[idx] for idx in row]
+        if exact[t_row] is not None and candidates[0] != exact[t_row]:
+            candidates = [exact[t_row]] + [c for c in candidates if c != exact[t_row]][:k - 1]
+        mapping[t_row] = candidates
     return mapping
 
 def build_output(template_structure, input_data, row_mapping):
@@ -45,22 +238,29 @@ def build_output(template_structure, input_data, row_mapping):
         if input_df is None or input_df.empty:
             continue
 
+        # Row position of each first-column label; the first occurrence wins,
+        # as the boolean-mask lookup it replaces returned the first match
+        label_to_idx = {}
+        for idx, label in enumerate(input_df.iloc[:, 0].astype(str).tolist()):
+            label_to_idx.setdefault(label, idx)
+
+        matched_idx = []
         for row_label in meta["rows"]:
             matched_label = row_mapping.get(row_label)
             if matched_label is None:
                 logger.warning(f"No match found for row: {row_label}")
                 continue
 
-            matched_row = input_df[input_df.iloc[:, 0].astype(str) == matched_label]
-            if matched_row.empty:
+            idx = label_to_idx.get(matched_label)
+            if idx is None:
                 logger.warning(f"No data found for matched row: {matched_label}")
                 continue
+            matched_idx.append(idx)
 
-            row_dict = {}
-            for col in meta["columns"]:
-                if col in matched_row.columns:
-                    row_dict[col] = matched_row[col].values[0]
-                else:
-                    row_dict[col] = None
-            output["sheets"][sheet_name].append(row_dict)
+        # Each template column is taken for all matched rows at once, then the
+        # rows are zipped back together; columns the input lacks are left None
+        columns = meta["columns"]
+        missing = [None] * len(matched_idx)
+        taken = [input_df[col].to_numpy()[matched_idx] if col in input_df.columns else missing for col in columns]
+        output["sheets"][sheet_name] = [dict(zip(columns, values)) for values in zip(*taken)]
     return output
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import openpyxl
+
+from tests.test_semantic_mapper import _fake_embeddings
+
+try:
+    import excel_processor
+except ImportError:  # optional, needs sentence-transformers and its model
+    excel_processor = None
+
+def _save_workbook(path, sheets):
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for title, rows in sheets.items():
+        ws = wb.create_sheet(title)
+        for row in rows:
+            ws.append(row)
+    wb.save(path)
+
+@unittest.skipIf(excel_processor is None, "sentence-transformers is not installed")
+class SemanticMappingTest(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(excel_processor, "OpenAPIClient"),
+            mock.patch("semantic_mapper._get_template_embeddings", side_effect=_fake_embeddings),
+            mock.patch("semantic_mapper._encode_cached", side_effect=_fake_embeddings),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+        self.processor = excel_processor.ExcelProcessor()
+        self.processor.template_path = os.path.join(self.dir, "template.xlsx")
+        _save_workbook(self.processor.template_path, {
+            "P&L": [["Particulars", "FY24"], ["Revenue", None], ["Total expenses", None]],
+            "BS": [["Particulars", "FY24"], ["Total assets", None], ["Total equity", None]],
+        })
+
+    def test_every_template_sheet_is_mapped_from_its_upload_sheet(self):
+        upload = os.path.join(self.dir, "upload.xlsx")
+        _save_workbook(upload, {
+            "P&L": [["Particulars", "FY24"], ["Total expenses", 80], ["Revenue", 100]],
+            "BS": [["Particulars", "FY24"], ["Total equity", 30], ["Total assets", 50]],
+        })
+        processed, uploaded = self.processor.process_with_semantic_mapping(upload)
+
+        self.assertEqual(sorted(uploaded), ["BS", "P&L"])
+        self.assertEqual(processed["sheets"]["P&L"], [
+            {"Particulars": "Revenue", "FY24": 100}, {"Particulars": "Total expenses", "FY24": 80}
+        ])
+        self.assertEqual(processed["sheets"]["BS"], [
+            {"Particulars": "Total assets", "FY24": 50}, {"Particulars": "Total equity", "FY24": 30}
+        ])
+
+    def test_missing_template_sheet_falls_back(self):
+        upload = os.path.join(self.dir, "upload.xlsx")
+        _save_workbook(upload, {"P&L": [["Particulars", "FY24"], ["Revenue", 100]]})
+        processed, uploaded = self.processor.process_with_semantic_mapping(upload)
+
+        self.assertIsNone(processed)
+        self.assertEqual(uploaded, {"P&L": [{"Particulars": "Revenue", "FY24": 100}]})
+
+@unittest.skipIf(excel_processor is None, "sentence-transformers is not installed")
+class FilterRelevantDataTest(unittest.TestCase):
+    def test_short_codes_match_whole_tokens_only(self):
+        with mock.patch.object(excel_processor, "OpenAPIClient"):
+            processor = excel_processor.ExcelProcessor()
+        names = ["Jobs", "Subsidiaries", "BS", "bs-2024", "P&L FY24", "Consolidated Balance Sheet", "CF", "CFO"]
+        uploaded = {name: [{"a": 1}] for name in names}
+        filtered = processor._filter_relevant_data(uploaded, {"sheets": {"CF": {}}})
+
+        self.assertEqual(list(filtered), ["BS", "bs-2024", "P&L FY24", "Consolidated Balance Sheet", "CF"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+
+import openpyxl
+
+from excel_writer import TemplateWorkbook
+
+def _archive_closed(workbook):
+    return workbook._archive.fp is None
+
+class TemplateWorkbookTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "template.xlsx")
+        self.template = TemplateWorkbook()
+        self._save(["P&L"], mtime=1)
+
+    def _save(self, titles, mtime):
+        wb = openpyxl.Workbook()
+        wb.active.title = titles[0]
+        for title in titles[1:]:
+            wb.create_sheet(title)
+        wb.save(self.path)
+        os.utime(self.path, (mtime, mtime))
+
+    def test_unchanged_file_reuses_workbook(self):
+        with self.template.use(self.path) as first:
+            pass
+        with self.template.use(self.path) as second:
+            self.assertIs(first, second)
+        self.assertFalse(_archive_closed(first))
+
+    def test_replaced_workbook_is_closed(self):
+        with self.template.use(self.path) as old:
+            pass
+        self._save(["P&L", "BS"], mtime=2)
+        with self.template.use(self.path) as new:
+            self.assertEqual(new.sheetnames, ["P&L", "BS"])
+        self.assertTrue(_archive_closed(old))
+        self.assertFalse(_archive_closed(new))
+
+    def test_replaced_workbook_stays_open_while_in_use(self):
+        with self.template.use(self.path) as old:
+            self._save(["P&L", "BS"], mtime=2)
+            with self.template.use(self.path) as new:
+                self.assertIsNot(old, new)
+            self.assertFalse(_archive_closed(old))
+            self.assertEqual([row for row in old["P&L"].iter_rows(values_only=True)], [])
+        self.assertTrue(_archive_closed(old))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,21 @@
+import unittest
+
+try:
+    from json_repair import load_repaired_json
+except ImportError:  # needs dirtyjson from requirements.txt
+    load_repaired_json = None
+
+@unittest.skipIf(load_repaired_json is None, "dirtyjson is not installed")
+class LoadRepairedJsonTest(unittest.TestCase):
+    def test_trailing_commas_and_bare_keys(self):
+        self.assertEqual(load_repaired_json('{sheets: {"S": [{"a": 1,},]}}'), {"sheets": {"S": [{"a": 1}]}})
+
+    def test_string_contents_are_kept(self):
+        self.assertEqual(load_repaired_json('{"note": "ratio: high", "x": "a,}",}'), {"note": "ratio: high", "x": "a,}"})
+
+    def test_unparseable_text_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            load_repaired_json('{"sheets": {"S": [1')
+
+if __name__ == "__main__":
+    unittest.main()
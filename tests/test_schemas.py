@@ -0,0 +1,35 @@
+import unittest
+
+import msgspec
+
+from schemas import MAX_BATCH_SIZE, batch_chat_request_decoder, chat_request_decoder
+
+def _batch(size):
+    return msgspec.json.encode({"messages_list": [[{"role": "user", "content": "hi"}]] * size})
+
+class BatchChatRequestTest(unittest.TestCase):
+    def test_batch_at_limit_is_accepted(self):
+        body = batch_chat_request_decoder.decode(_batch(MAX_BATCH_SIZE))
+        self.assertEqual(len(body.messages_list), MAX_BATCH_SIZE)
+
+    def test_oversized_batch_is_rejected(self):
+        # parse_json_body answers any msgspec.DecodeError with a 400
+        with self.assertRaises(msgspec.DecodeError):
+            batch_chat_request_decoder.decode(_batch(MAX_BATCH_SIZE + 1))
+
+    def test_empty_batch_is_rejected(self):
+        with self.assertRaises(msgspec.DecodeError):
+            batch_chat_request_decoder.decode(_batch(0))
+
+class ChatRequestTest(unittest.TestCase):
+    def test_extra_message_fields_are_forwarded(self):
+        message = {"role": "assistant", "content": None, "function_call": {"name": "f", "arguments": "{}"}}
+        body = chat_request_decoder.decode(msgspec.json.encode({"messages": [message]}))
+        self.assertEqual(body.messages, [message])
+
+    def test_mistyped_message_is_rejected(self):
+        with self.assertRaises(msgspec.DecodeError):
+            chat_request_decoder.decode(b'{"messages": [{"role": 1}]}')
+
+if __name__ == "__main__":
+    unittest.main()
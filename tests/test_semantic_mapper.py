@@ -0,0 +1,55 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+try:
+    import semantic_mapper
+except ImportError:  # optional, needs sentence-transformers and its model
+    semantic_mapper = None
+
+def _fake_embeddings(texts):
+    # Deterministic unit vectors: rows sharing words score higher
+    out = np.zeros((len(texts), 16), dtype=np.float32)
+    for i, text in enumerate(texts):
+        for word in text.lower().split():
+            out[i, sum(word.encode()) % 16] += 1
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return out / norms
+
+@unittest.skipIf(semantic_mapper is None, "sentence-transformers is not installed")
+class MatchRowsTest(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(semantic_mapper, "_get_template_embeddings", side_effect=_fake_embeddings),
+            mock.patch.object(semantic_mapper, "_encode_cached", side_effect=_fake_embeddings),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_empty_input_rows(self):
+        template_rows = ["Revenue", "Total expenses"]
+        self.assertEqual(semantic_mapper.match_rows(template_rows, []), {"Revenue": None, "Total expenses": None})
+        self.assertEqual(semantic_mapper.match_rows(template_rows, [], k=3), {"Revenue": [], "Total expenses": []})
+
+    def test_empty_template_rows(self):
+        self.assertEqual(semantic_mapper.match_rows([], ["Revenue"]), {})
+        self.assertEqual(semantic_mapper.match_rows([], ["Revenue"], k=3), {})
+
+    def test_k_larger_than_input_rows(self):
+        template_rows = ["Revenue from operations", "Total expenses", "Other income"]
+        input_rows = ["Total expenses", "Revenue from operations", "Total expenses"]
+        top1 = semantic_mapper.match_rows(template_rows, input_rows)
+        topk = semantic_mapper.match_rows(template_rows, input_rows, k=5)
+
+        for t_row in template_rows:
+            # Repeated input labels are candidates once, so only two are left
+            self.assertCountEqual(topk[t_row], ["Total expenses", "Revenue from operations"])
+            self.assertEqual(topk[t_row][0], top1[t_row])
+        self.assertEqual(top1["Revenue from operations"], "Revenue from operations")
+        self.assertEqual(top1["Total expenses"], "Total expenses")
+
+if __name__ == "__main__":
+    unittest.main()